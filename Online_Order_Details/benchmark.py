@@ -0,0 +1,302 @@
+"""
+--------------------------------------------------------
+Title       : OrderInfoSystem - Benchmark Suite
+File        : benchmark.py
+
+Description :
+Measures how the main operations of main.py scale with the number of orders.
+
+For each table size it:
+- Generates a synthetic OrderDetails.csv (configurable name/item cardinality
+  and status mix) in a temporary folder
+- Times load, display, query, report, add, delete, save, compact and the
+  binary snapshot, recording wall time and the peak memory each operation allocates
+- Can run against the CSV or the SQLite storage backend
+- Can compare file size and throughput of plain, gzip and zstd order files
+- Writes machine-readable JSON results that can be compared across versions
+
+Each table size runs in a fresh Python process so memory figures do not mix.
+Memory is traced with tracemalloc in a second process per size, because tracing
+slows the operations down several times and would distort the timings.
+
+Usage:
+    python benchmark.py --sizes 1000,10000,100000 --output results.json
+    python benchmark.py --sizes 100000 --backend sqlite
+    python benchmark.py --sizes 100000 --formats
+    python benchmark.py --compare old_results.json results.json
+------------------------------------------------
+"""
+
+# --- Imports ---
+import argparse    # For the command line options
+import contextlib  # For hiding the messages printed by main.py while timing
+import csv         # For writing the synthetic CSV file
+import io          # For capturing display output in memory
+import json        # For the machine-readable results
+import os          # For the temporary working folder
+import platform    # For recording the Python version in the results
+import random      # For generating synthetic orders
+import subprocess  # For running each table size in a fresh process
+import sys         # For the Python executable and exit codes
+import tempfile    # For the temporary working folder
+import time        # For measuring wall time
+import tracemalloc # For measuring the peak memory of each operation
+
+# --- Default Settings ---
+default_sizes = [1000, 10000, 100000]  # Table sizes (number of orders) to measure
+default_names = 5000            # Number of distinct customer names
+default_items = 300             # Number of distinct items
+default_status_mix = "Shipped:0.5,Delivered:0.4,Cancelled:0.1"  # Status weights
+change_batch = 1000             # Number of orders added and deleted per measurement
+trace_memory = False            # Flag set in the memory pass: trace allocations instead of timing
+default_threshold = 0.20        # Slow-down (20%) that counts as a regression when comparing
+
+# Function to generate a synthetic order file
+# Names, items, statuses and dates are picked at random with a fixed seed, so the
+# same settings always produce the same file.
+def generate_orders_csv(path, rows, name_count, item_count, status_mix, seed=1):
+    generator = random.Random(seed)
+    names = [f"Customer {number}" for number in range(name_count)]
+    items = [f"Item {number}" for number in range(item_count)]
+    statuses = list(status_mix)
+    weights = [status_mix[status] for status in statuses]
+
+    with open(path, mode='w', newline='') as csv_file_obj:
+        csv_writer = csv.writer(csv_file_obj)
+        csv_writer.writerow(["Order_ID", "Customer_Name", "Item_Purchased", "Quantity",
+                             "Order_Date", "Total_Price ($)", "Order_Status"])
+        for number in range(rows):
+            csv_writer.writerow([1001 + number,
+                                 generator.choice(names),
+                                 generator.choice(items),
+                                 generator.randint(1, 5),
+                                 f"{generator.randint(1, 28):02d}/{generator.randint(1, 12):02d}/2025",
+                                 round(generator.uniform(5, 500), 2),
+                                 generator.choices(statuses, weights)[0]])
+
+# Function to read the status mix option ("Shipped:0.5,Delivered:0.4,...")
+def parse_status_mix(text):
+    status_mix = {}
+    for part in text.split(","):
+        status, weight = part.split(":")
+        status_mix[status.strip()] = float(weight)
+    return status_mix
+
+# Function to time one operation
+# The messages main.py prints are captured so they do not distort the timing.
+# In the memory pass (trace_memory) the operation runs under tracemalloc instead and
+# the peak memory it allocated on top of what was already in use is recorded.
+# Returns the result entry, so extra figures can be added to it.
+def measure(results, rows, operation, function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        function(*args)
+        seconds = time.perf_counter() - start
+        if trace_memory:
+            peak_mb = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+            tracemalloc.stop()
+    results.append({"rows": rows, "operation": operation, "seconds": round(seconds, 6)})
+    if trace_memory:
+        results[-1]["peak_mb"] = peak_mb
+    return results[-1]
+
+# Function to add the file size and throughput (uncompressed MB per second) to a result entry
+def add_file_figures(entry, path, plain_bytes):
+    entry["file_bytes"] = os.path.getsize(path)
+    entry["mb_per_s"] = round(plain_bytes / 1e6 / entry["seconds"], 1) if entry["seconds"] else None
+
+# Function to write and load the loaded orders as plain, gzip and zstd files
+# zstd is skipped when the zstandard package is not installed.
+def measure_formats(results, rows, main):
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.load_records('csv', False)
+    plain_name = main.file_name
+    plain_bytes = os.path.getsize(plain_name)
+
+    for compression, extension in (("plain", ""), ("gzip", ".gz"), ("zstd", ".zst")):
+        if compression == "zstd" and main.zstandard is None:
+            continue
+        main.file_name = plain_name + extension
+        add_file_figures(measure(results, rows, f"write_{compression}", main.write_csv_file),
+                         main.file_name, plain_bytes)
+        add_file_figures(measure(results, rows, f"load_{compression}", main.load_records, 'csv', False),
+                         main.file_name, plain_bytes)
+    main.file_name = plain_name
+
+# Function to run every measurement for one table size (in a fresh process)
+# Works in a temporary folder so no real order files are touched.
+# Returns the list of result entries.
+def run_size(rows, name_count, item_count, status_mix, backend, formats):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_folder:
+        os.chdir(work_folder)
+        measure(results, rows, "generate", generate_orders_csv, main.file_name,
+                rows, name_count, item_count, status_mix)
+
+        if backend == 'sqlite':
+            # Copy the generated file into the database, then work on the database only
+            with contextlib.redirect_stdout(io.StringIO()):
+                main.load_records('csv', False)
+            measure(results, rows, "write_database", main.write_database)
+            main.clear_array()
+            main.storage_backend = 'sqlite'
+            measure(results, rows, "display_page_lazy", main.print_records, None, 1)
+            measure(results, rows, "load_database", main.load_records, 'database', False)
+        else:
+            measure(results, rows, "load_csv", main.load_records, 'csv', False)
+        measure(results, rows, "display_page", main.render_page, 0, main.display_page_size)
+        measure(results, rows, "display_all", main.print_records)
+        measure(results, rows, "query", main.query_records, "Customer 1", None, "Cancelled")
+        measure(results, rows, "report_item", main.report_totals, 'item')
+
+        # Add and delete a batch of orders, one call per order
+        generator = random.Random(2)
+        batch = min(change_batch, rows)
+        today = "01/01/2026"
+
+        def add_batch():
+            for number in range(batch):
+                main.add_order(main.new_last_row_id(), "Benchmark Customer", "Benchmark Item",
+                               1, today, 9.99, "Shipped")
+
+        def delete_batch():
+            for delete_id in generator.sample(range(1001, 1001 + rows), batch):
+                main.delete_order(delete_id)
+
+        measure(results, rows, "add", add_batch)
+        measure(results, rows, "delete", delete_batch)
+        measure(results, rows, "save", main.save_records)
+        measure(results, rows, "compact", main.compact_files)
+        if backend == 'csv':
+            measure(results, rows, "snapshot_export", main.write_snapshot, 0)
+            measure(results, rows, "load_snapshot", main.load_records, 'snapshot', False)
+        if formats and backend == 'csv':
+            measure_formats(results, rows, main)
+        if main.database_connection is not None:
+            main.database_connection.close()
+        os.chdir(os.path.dirname(work_folder))
+    return results
+
+# Function to run every measurement for one table size in its own Python process
+# Returns the list of result entries.
+def run_size_process(rows, name_count, item_count, status_mix_text, backend, formats, memory_pass):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-size", str(rows),
+         "--names", str(name_count), "--items", str(item_count), "--status-mix", status_mix_text,
+         "--backend", backend] + (["--formats"] if formats else []) + (["--trace-memory"] if memory_pass else []),
+        capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        raise RuntimeError(f"Benchmark for {rows} orders failed")
+    return json.loads(completed.stdout)
+
+# Function to run all table sizes, each in its own Python process
+# Every size is run once for the timings and, unless 'memory' is False, once more
+# under tracemalloc for the peak memory of each operation.
+def run_benchmarks(sizes, name_count, item_count, status_mix_text, backend, formats, label, memory=True):
+    all_results = []
+    for rows in sizes:
+        print(f"Measuring {rows} orders...", file=sys.stderr)
+        results = run_size_process(rows, name_count, item_count, status_mix_text, backend, formats, False)
+        if memory:
+            print(f"Measuring the memory of {rows} orders...", file=sys.stderr)
+            peaks = {entry["operation"]: entry["peak_mb"]
+                     for entry in run_size_process(rows, name_count, item_count, status_mix_text,
+                                                   backend, formats, True)}
+            for entry in results:
+                entry["peak_mb"] = peaks.get(entry["operation"])
+        all_results.extend(results)
+
+    return {"label": label,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {"names": name_count, "items": item_count, "status_mix": status_mix_text,
+                         "backend": backend, "formats": formats},
+            "results": all_results}
+
+# Function to print results as a table
+def print_results(report):
+    print(f"\n{'Rows':>10}  {'Operation':<18} {'Seconds':>12} {'Peak (MB)':>14} {'File (MB)':>10} {'MB/s':>8}")
+    print("-" * 78)
+    for entry in report["results"]:
+        peak = "-" if entry.get("peak_mb") is None else f"{entry['peak_mb']:.1f}"
+        size = f"{entry['file_bytes'] / 1e6:.2f}" if "file_bytes" in entry else ""
+        speed = f"{entry['mb_per_s']}" if entry.get("mb_per_s") is not None else ""
+        print(f"{entry['rows']:>10}  {entry['operation']:<18} {entry['seconds']:>12.6f} {peak:>14} {size:>10} {speed:>8}")
+
+# Function to compare two result files and list the operations that got slower
+# Returns the number of regressions (slower by more than 'threshold').
+def compare_results(old_file_name, new_file_name, threshold):
+    with open(old_file_name) as old_obj, open(new_file_name) as new_obj:
+        old_report = json.load(old_obj)
+        new_report = json.load(new_obj)
+
+    old_times = {(entry["rows"], entry["operation"]): entry["seconds"] for entry in old_report["results"]}
+    regressions = 0
+    print(f"\n{'Rows':>10}  {'Operation':<18} {'Old (s)':>12} {'New (s)':>12} {'Change':>9}")
+    print("-" * 66)
+    for entry in new_report["results"]:
+        key = (entry["rows"], entry["operation"])
+        if key not in old_times:
+            continue
+        old_seconds = old_times[key]
+        change = (entry["seconds"] - old_seconds) / old_seconds if old_seconds else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key[0]:>10}  {key[1]:<18} {old_seconds:>12.6f} {entry['seconds']:>12.6f} {change:>+8.1%}{flag}")
+    print(f"\n{regressions} regressions (threshold {threshold:.0%}).")
+    return regressions
+
+# Function to read the command line options and run the benchmarks
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the OrderInfoSystem operations.")
+    parser.add_argument('--sizes', default=",".join(map(str, default_sizes)),
+                        help="comma-separated table sizes, e.g. 1000,10000,100000,1000000,10000000")
+    parser.add_argument('--names', type=int, default=default_names, help="distinct customer names")
+    parser.add_argument('--items', type=int, default=default_items, help="distinct items")
+    parser.add_argument('--status-mix', default=default_status_mix, help="status weights, e.g. Shipped:0.5,...")
+    parser.add_argument('--backend', choices=('csv', 'sqlite'), default='csv', help="storage backend to measure")
+    parser.add_argument('--formats', action='store_true',
+                        help="also compare plain, gzip and zstd order files (size and throughput)")
+    parser.add_argument('--label', default="", help="version label stored in the results")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files")
+    parser.add_argument('--threshold', type=float, default=default_threshold,
+                        help="slow-down that counts as a regression (0.2 = 20%%)")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip the second run per size that measures peak memory")
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)  # Used by the child processes
+    parser.add_argument('--trace-memory', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare_results(args.compare[0], args.compare[1], args.threshold) else 0
+
+    global trace_memory
+    status_mix = parse_status_mix(args.status_mix)
+    if args.run_size is not None:
+        trace_memory = args.trace_memory
+        json.dump(run_size(args.run_size, args.names, args.items, status_mix, args.backend, args.formats), sys.stdout)
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    report = run_benchmarks(sizes, args.names, args.items, args.status_mix, args.backend, args.formats, args.label,
+                            not args.no_memory)
+    print_results(report)
+    if args.output:
+        with open(args.output, mode='w') as output_obj:
+            json.dump(report, output_obj, indent=2)
+        print(f"\nResults written to '{args.output}'.")
+    return 0
+
+
+# To run the benchmarks when run as a script
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,44 +17,589 @@ It uses parallel arrays to:
 - Delete existing records
 - Save updated records back to the CSV file
 
+Run without arguments for the interactive menu, or with operations such as
+'python main.py load + query --status Cancelled + report status' to run them
+from scripts. Importing this module has no side effects.
+
 Developed using only procedural Python (no classes or OOP).
 ------------------------------------------------
 """
 
 # --- Imports ---
+import argparse  # For the non-interactive command line interface
+import bisect    # For searching the sorted order date index
+import cProfile  # For the optional profiler capture of one operation
 import csv       # For reading and writing CSV files
+from array import array  # For compact typed columns
+from concurrent.futures import ProcessPoolExecutor  # For parsing large CSV files on several cores
 import datetime  # For capturing the current date on new orders
+import functools # For wrapping the instrumented operations
+import gzip      # For reading and writing gzip-compressed order files
+import io        # For reading a byte range of the CSV file as text
+import json      # For reading JSON-lines bulk import files
+import math      # For rejecting prices that are not finite numbers
+import mmap      # For reading the binary snapshot without copying it through Python
+import os        # For flushing saved data to disk and replacing files atomically
+import pstats    # For formatting the profiler report
+import sqlite3   # For the optional SQLite storage backend
+import struct    # For packing the binary snapshot header
 import sys       # For exiting the application using sys.exit()
+import time      # For timing the instrumented operations
+import tracemalloc  # For the optional memory capture of one operation
+
+try:
+    import resource  # For reporting peak memory use (Unix only)
+except ImportError:
+    resource = None
+
+try:
+    import fcntl     # For locking the Order ID file between processes (Unix only)
+except ImportError:
+    fcntl = None
+
+try:
+    import numpy     # Optional: speeds up the aggregate reports
+except ImportError:
+    numpy = None
+
+try:
+    import zstandard # Optional: reading and writing zstd-compressed order files
+except ImportError:
+    zstandard = None
 
 # --- Global Variables (Parallel Arrays) ---
-# Each list represents one column of the order data table.
-order_id = []                   # int: Unique order identifier
-customer_name = []              # str: Name of the customer
-item_purchased = []             # str: Item bought by the customer
-quantity = []                   # int: Number of items purchased
-order_date = []                 # datetime: Date of purchase in DD/MM/YYYY format
-total_price = []                # float: Total cost of the order
-order_status = []               # str: Status like 'Shipped', 'Delivered', 'Cancelled'
+# Each typed array represents one column of the order data table.
+# Text columns are dictionary-encoded: the array holds a small integer code and
+# the matching lookup table holds each distinct value only once.
+order_id = array('q')           # int: Unique order identifier
+customer_name = array('I')      # int: Code of the customer name in customer_name_table
+item_purchased = array('I')     # int: Code of the item in item_purchased_table
+quantity = array('q')           # int: Number of items purchased
+order_date = array('i')         # int: Date of purchase as a day ordinal (shown in DD/MM/YYYY format)
+total_price = array('d')        # float: Total cost of the order
+order_status = array('H')       # int: Code of the status ('Shipped', 'Delivered', 'Cancelled') in order_status_table
+
+# All columns in table order, used when every column gets the same operation
+order_columns = (order_id, customer_name, item_purchased, quantity,
+                 order_date, total_price, order_status)
+
+# Lookup tables for the dictionary-encoded columns (code -> value, value -> code and
+# lower-case value -> codes for the queries that ignore upper/lower case)
+customer_name_table = []        # list: Distinct customer names
+customer_name_codes = {}        # dict: customer name -> code
+customer_name_lower = {}        # dict: lower-case customer name -> list of codes
+item_purchased_table = []       # list: Distinct item names
+item_purchased_codes = {}       # dict: item name -> code
+item_purchased_lower = {}       # dict: lower-case item name -> list of codes
+order_status_table = []         # list: Distinct order statuses
+order_status_codes = {}         # dict: order status -> code
+order_status_lower = {}         # dict: lower-case order status -> list of codes
+date_format = "%d/%m/%Y"        # Date format used in the CSV file and on screen
+date_cache = {}                 # dict: DD/MM/YYYY text -> day ordinal (there are few distinct dates)
+date_text_cache = {}            # dict: day ordinal -> DD/MM/YYYY text
+date_cache_limit = 100000       # The date caches are emptied once they hold this many entries
 
 # Other global variables
 column_header = ["Order_ID", "Customer_Name", "Item_Purchased",
                  "Qty", "Order_Date", "Total($)", "Status"] # Set the Column headers
-file_name = 'OrderDetails.csv'  # The CSV file name used for persistence
+# Header row written to new order files; any header whose names match the aliases in
+# import_field_names (such as column_header) is read as the same columns
+csv_header = ["Order_ID", "Customer_Name", "Item_Purchased", "Quantity",
+              "Order_Date", "Total_Price ($)", "Order_Status"]
+order_fields = ('id', 'name', 'item', 'qty', 'date', 'price', 'status')  # Field keys in column order
+file_name = 'OrderDetails.csv'  # The CSV file name used for persistence (add .gz or .zst to compress it)
+gzip_level = 6                  # Compression level for .gz order files (1 = fastest, 9 = smallest)
+zstd_level = 3                  # Compression level for .zst order files (1 = fastest, 19 = smallest)
+valid_statuses = ("Shipped", "Delivered", "Cancelled")  # Allowed order statuses
 records_loaded = False          # Flag to track whether data has been loaded to in-memory
 records_not_saved = False       # Flag to track whether data added to in-memory has been saved to csv file
 data_found = False              # A flag to check if any records exist in the csv file
 
-def new_last_row_id():
+# --- Order ID Allocation ---
+id_file_name = 'OrderDetails.lastid'  # Highest Order ID handed out so far (high-water mark)
+first_order_id = 1001           # Order ID given to the very first order
+tail_read_size = 4096           # Bytes read per step when reading the last line of the CSV file
+
+# --- Order ID Index ---
+# Maps each live Order ID to its row position in the parallel arrays so that
+# lookups and deletes do not need to scan the order_id list.
+order_index = {}                # dict: order_id -> row position in the parallel arrays
+deleted_rows = set()            # set: row positions marked as deleted (tombstones), removed on compaction
+compact_min_rows = 1000         # Minimum number of tombstones before an automatic compaction
+compact_ratio = 0.25            # Compact automatically once this fraction of rows are tombstones
+
+# --- Secondary Indexes ---
+# Inverted indexes from a customer, item or status code to the Order IDs that have
+# it, plus the order dates kept sorted for date range searches. They are built once
+# at the end of a load and then updated on every add. Deletes and changes leave the
+# old entries in place (an entry only counts while its order still has that value),
+# and the stale entries are purged together once there are enough of them.
+customer_index = {}             # dict: customer name code -> array of Order IDs
+item_index = {}                 # dict: item code -> array of Order IDs
+status_index = {}               # dict: status code -> array of Order IDs
+date_index_days = array('i')    # Day ordinals of the orders, sorted by (day, Order ID)
+date_index_ids = array('q')     # Order IDs in the same order as date_index_days
+stale_index_entries = 0         # Number of rows whose old index entries are still in the indexes
+indexes_ready = True            # Flag to track whether the secondary indexes match the arrays
+
+# --- Summary Cache ---
+# Running totals of the live orders, kept up to date together with the secondary
+# indexes (one O(1) step per added, deleted or changed row) and rebuilt with them
+# after a load. Shown in the main menu header and returned by order_summary().
+summary_status = {}             # dict: status code -> [order count, total quantity, total revenue]
+summary_items = {}              # dict: item code -> order count
+summary_top_items = 3           # Number of best-selling items shown in the menu header
+
+# --- Loader Settings ---
+load_chunk_size = 10000         # Number of CSV rows parsed per batch by the streaming loader
+load_window_size = 0            # Keep only the most recent N orders in memory (0 = keep all orders)
+parse_workers = 0               # Worker processes for parallel CSV parsing (0 or 1 = parse in this process)
+parallel_min_bytes = 8 * 1024 * 1024  # CSV files smaller than this are always parsed in this process
+
+# --- Batch Operation Settings ---
+batch_index_min_rows = 100      # Batch deletes of at least this many rows count their stale index entries at once
+batch_max_ids = 1000000         # Most Order IDs one list of IDs and ranges may name
+
+# --- Incremental Reload ---
+# Where the CSV file ended when it was loaded, so a refresh only reads the rows
+# appended after that point. None when the records did not come from the CSV file.
+loaded_file_state = None        # dict: device, inode, size, mtime, offset, fingerprint, row and line counts, header
+fingerprint_size = 64           # Bytes just before the loaded offset compared to spot a rewritten file
+
+# --- Bulk Import Settings ---
+import_batch_size = 10000       # Number of import rows validated per batch
+# Accepted column names (lower case, letters only) in bulk import files and order file headers
+import_field_names = {
+    "orderid": "id", "id": "id",
+    "customername": "name", "customer": "name", "name": "name",
+    "itempurchased": "item", "item": "item",
+    "quantity": "qty", "qty": "qty",
+    "orderdate": "date", "date": "date",
+    "totalprice": "price", "total": "price", "price": "price",
+    "orderstatus": "status", "status": "status"
+}
+
+# --- Display Settings ---
+display_page_size = 20          # Number of rows shown per page by the record viewer
+
+# --- Write-Ahead Journal ---
+# Saving appends the add/delete operations made since the last save to the journal
+# instead of rewriting the CSV file. Loading replays the journal on top of the CSV
+# file, and compaction folds the journal back into a fresh CSV file.
+journal_file_name = 'OrderDetails.journal'  # Append-only log of changes not yet written into the CSV file
+pending_changes = []            # list: Journal entries made in memory since the last save
+journal_op_count = 0            # Number of operations currently stored in the journal file
+journal_compact_ops = 10000     # Compact automatically once the journal holds this many operations
+journal_end_offset = 0          # Byte offset just after the last committed journal batch that was replayed
+
+# --- Binary Snapshot ---
+# A snapshot stores the columns as raw little-endian arrays plus the three lookup
+# tables, so loading it only copies memory instead of parsing CSV text.
+snapshot_file_name = 'OrderDetails.snap'  # Binary snapshot of the order table
+snapshot_magic = b'OISNAP'      # Identifies a snapshot file
+snapshot_version = 1            # Snapshot format version, increased when the layout changes
+# Header: magic, version, row count, journal offset included in the snapshot
+snapshot_header = struct.Struct('<6sHQQ')
+
+# --- Storage Backend ---
+# 'csv' keeps the orders in OrderDetails.csv with the journal and snapshot files.
+# 'sqlite' keeps them in one SQLite database instead: each save is one transaction
+# and the viewer reads one page at a time, so the records do not have to be loaded.
+# 'partitions' keeps one CSV file per order month (see Partitioned Storage below).
+storage_backend = 'csv'         # Storage used by load and save: 'csv', 'sqlite' or 'partitions'
+database_file_name = 'OrderDetails.db'  # SQLite database used by the 'sqlite' backend
+database_connection = None      # Open connection to the database (opened on first use)
+database_columns = ("order_id, customer_name, item_purchased, quantity, "
+                    "order_date, total_price, order_status")  # Column order of the orders table
+lowest_order_id = -2 ** 63      # Smaller than any Order ID, used as the start of the first page
+
+# --- Partitioned Storage ---
+# The 'partitions' backend splits the orders by order month into plain CSV files
+# (orders_YYYY-MM.csv). The manifest records the Order ID range, row count and status
+# counts of each partition, so a load can skip the partitions a query cannot match
+# and a save only rewrites (or appends to) the partitions its changes touch.
+partition_folder = 'OrderDetails.parts'  # Folder holding the monthly partition files
+manifest_file_name = 'manifest.json'     # Partition manifest inside partition_folder
+manifest_version = 1            # Manifest format version
+loaded_partitions = None        # set: Months loaded into memory (None = every partition, or not loaded)
+
+# --- File Locking and Versioning ---
+# Loads and refreshes hold a shared lock on the lock file while they read the order
+# files, and saves, compaction and conversions hold an exclusive lock while they
+# write them. Every write also increases the version stamp, so a save can tell that
+# another session saved in between: changes to other orders are merged, changes to
+# the same orders reject the save.
+lock_file_name = 'OrderDetails.lock'        # Lock file for the order files (stays empty)
+version_file_name = 'OrderDetails.version'  # Version stamp: save count and rewrite (compaction) count
+storage_lock = None             # list: [lock file object, exclusive flag, nesting depth] while locked
+loaded_version = None           # tuple: Version stamp the records in memory are up to date with
+save_conflict_mode = 'merge'    # 'merge' other sessions' changes when possible, or 'reject' every save after one
+
+# --- Instrumentation ---
+# Off by default. When switched on, each instrumented operation records how often it
+# ran, how long it took and how many rows and bytes it handled. One operation can
+# also be captured with cProfile or tracemalloc.
+stats_enabled = False           # Flag to turn the operation statistics on
+operation_stats = {}            # dict: operation name -> dict of counters
+instrumented_operations = []    # list: Names of the operations that can be measured or profiled
+active_operations = []          # list: Instrumented operations currently running (outermost first)
+profile_operation = None        # Name of the next operation to capture with a profiler (None = off)
+profile_mode = 'cprofile'       # Profiler used for the capture: 'cprofile' or 'tracemalloc'
+profile_lines = 25              # Number of entries shown in a profiler report
+profile_report = ""             # Text of the last profiler report
+
+# Function to add to a counter ('rows', 'bytes_read', 'bytes_written' or
+# 'parse_errors') of every instrumented operation that is running
+def count_stat(counter, amount=1):
+    if stats_enabled:
+        for name in active_operations:
+            operation_stats[name][counter] += amount
+
+# Function to create the empty counters of one operation
+def new_stats_entry():
+    return {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0,
+            'bytes_read': 0, 'bytes_written': 0, 'parse_errors': 0}
+
+# Function to run one operation under cProfile or tracemalloc
+# The report is kept in 'profile_report' and printed after the operation.
+def run_profiled(function, args, kwargs):
+    global profile_report
+    if profile_mode == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            statistics = tracemalloc.take_snapshot().statistics('lineno')
+            tracemalloc.stop()
+        lines = [f"Peak traced memory: {peak / 1024 / 1024:.1f} MB",
+                 "Largest allocations still held at the end:"]
+        lines.extend(str(statistic) for statistic in statistics[:profile_lines])
+        report = "\n".join(lines) + "\n"
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            profiler.disable()
+        report_text = io.StringIO()
+        pstats.Stats(profiler, stream=report_text).sort_stats('cumulative').print_stats(profile_lines)
+        report = report_text.getvalue()
+
+    profile_report = f"Profile of '{function.__name__}' ({profile_mode}):\n{report}"
+    print("\n" + profile_report)
+    return result
+
+# Function to add timing and counters to an operation (used as a decorator)
+# When statistics are off and the operation is not being profiled, the only cost
+# is one flag check per call.
+def instrumented(function):
+    name = function.__name__
+    instrumented_operations.append(name)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        global profile_operation
+        profiling = profile_operation == name
+        if not stats_enabled and not profiling:
+            return function(*args, **kwargs)
+
+        entry = operation_stats.setdefault(name, new_stats_entry())
+        active_operations.append(name)
+        start = time.perf_counter()
+        try:
+            if profiling:
+                profile_operation = None  # Capture a single run only
+                return run_profiled(function, args, kwargs)
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            active_operations.pop()
+            if stats_enabled:
+                entry['calls'] += 1
+                entry['seconds'] += seconds
+                entry['max_seconds'] = max(entry['max_seconds'], seconds)
+    return wrapper
+
+# Function to clear the collected statistics
+def reset_stats():
+    operation_stats.clear()
+
+# Function to build the statistics table as text
+def format_stats():
+    lines = [f"\n{'Operation Statistics':^100}",
+             "=" * 100,
+             f"{'Operation':<18} {'Calls':>7} {'Total (s)':>11} {'Avg (ms)':>10} {'Max (ms)':>10} "
+             f"{'Rows':>10} {'Read (KB)':>10} {'Written (KB)':>12} {'Errors':>7}",
+             "-" * 100]
+    for name, entry in sorted(operation_stats.items()):
+        average = entry['seconds'] / entry['calls'] * 1000 if entry['calls'] else 0.0
+        lines.append(f"{name:<18} {entry['calls']:>7} {entry['seconds']:>11.4f} {average:>10.2f} "
+                     f"{entry['max_seconds'] * 1000:>10.2f} {entry['rows']:>10} "
+                     f"{entry['bytes_read'] / 1024:>10.1f} {entry['bytes_written'] / 1024:>12.1f} "
+                     f"{entry['parse_errors']:>7}")
+    if not operation_stats:
+        lines.append("No statistics collected yet" + ("." if stats_enabled else " (statistics are off)."))
+    lines.append("-" * 100)
+    lines.append(f"Peak memory: {peak_memory_text()}\n")
+    return "\n".join(lines)
+
+# Function to write the collected statistics to a JSON file
+def write_stats_json(stats_file_name):
+    with open(stats_file_name, mode='w') as stats_obj:
+        json.dump({'enabled': stats_enabled,
+                   'operations': operation_stats,
+                   'peak_memory': peak_memory_text(),
+                   'profile_report': profile_report}, stats_obj, indent=2)
+
+# Function to get the compression of an order file from its extension
+# Returns 'gzip', 'zstd' or None for a plain file.
+def file_compression(path):
+    if path.endswith('.gz'):
+        return 'gzip'
+    if path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+# Function to open an order file as text, compressing or decompressing on the fly
+# 'mode' is 'r', 'w' or 'a'. The data is streamed, so a compressed file never has
+# to fit in memory. 'compression' overrides the extension (used for temporary files).
+def open_order_file(path, mode='r', compression=None):
+    compression = compression or file_compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, mode + 't', compresslevel=gzip_level, newline='')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(f"'{path}' is zstd-compressed; install the zstandard package to use it")
+        compressor = None if mode == 'r' else zstandard.ZstdCompressor(level=zstd_level)
+        return zstandard.open(path, mode, cctx=compressor, newline='')
+    return open(path, mode=mode, newline='')
+
+# Function to flush a closed file to disk (compressed files are only complete once closed)
+def sync_file(path):
+    file_descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+
+# Function to read the Order ID on the last line of the CSV file
+# Reads backwards from the end of the file in small blocks, so the cost does not
+# depend on the file size. A compressed file has to be read from the start instead.
+# Returns first_order_id - 1 if the file has no data rows.
+def read_last_order_id():
     try:
-        with open(file_name, mode='r', newline='') as csv_file_obj:
-            csv_reader = list(csv.reader(csv_file_obj))  # Convert iterator to list
+        if file_compression(file_name):
+            last_row = []
+            with open_order_file(file_name) as csv_file_obj:
+                for row in csv.reader(csv_file_obj):
+                    last_row = row or last_row
+            return int(last_row[0])
+
+        with open(file_name, mode='rb') as csv_file_obj:
+            csv_file_obj.seek(0, os.SEEK_END)
+            position = csv_file_obj.tell()
+            tail = b""
+
+            # Step back until the tail holds a complete last line
+            while position > 0:
+                step = min(tail_read_size, position)
+                position -= step
+                csv_file_obj.seek(position)
+                tail = csv_file_obj.read(step) + tail
+                if tail.strip(b"\r\n").count(b"\n") >= 1:
+                    break
 
-            if len(csv_reader) <= 1:
-                get_new_order_id = 1001  # Only header or empty file
-            else:
-                last_row = csv_reader[-1]  # Last data row (not header)
-                # Auto-generate a new Order ID
-                get_new_order_id = int(last_row[0]) + 1
+        lines = tail.strip(b"\r\n").splitlines()
+        last_row = next(csv.reader([lines[-1].decode()])) if lines else []
+        return int(last_row[0])
+    except (FileNotFoundError, ValueError, IndexError):
+        return first_order_id - 1  # No file, empty file or only the header
+
+# Function to check whether a non-empty file is missing its final line break
+# Appending a row to such a file would join it onto the last line. A compressed file
+# would have to be decompressed in full to check (it may have been made with gzip or
+# zstd from a file without one), so it is always treated as missing it; the blank
+# line this may add is skipped when the file is read.
+def missing_final_newline(path):
+    if file_compression(path):
+        return os.path.exists(path)
+    try:
+        with open(path, mode='rb') as file_obj:
+            file_obj.seek(0, os.SEEK_END)
+            if file_obj.tell() == 0:
+                return False
+            file_obj.seek(-1, os.SEEK_END)
+            return file_obj.read(1) != b"\n"
+    except FileNotFoundError:
+        return False
+
+# Function to lock or unlock the Order ID file so only one process allocates at a time
+def lock_id_file(id_file_obj, lock):
+    if fcntl is not None:
+        fcntl.flock(id_file_obj.fileno(), fcntl.LOCK_EX if lock else fcntl.LOCK_UN)
+
+# Function to lock the order files against other sessions
+# A shared lock lets other sessions read but not write; an exclusive lock keeps every
+# other session out. Locks nest, so an operation can call another locked operation.
+# With 'wait' False, returns False instead of waiting while another session holds the
+# lock (the order server retries without holding up its clients); otherwise returns True.
+def acquire_storage_lock(exclusive, wait=True):
+    global storage_lock
+    if storage_lock is not None:
+        if exclusive and not storage_lock[1]:
+            raise RuntimeError("a shared storage lock cannot be made exclusive")
+        storage_lock[2] += 1
+        return True
+
+    lock_obj = open(lock_file_name, mode='a')
+    if fcntl is not None:
+        lock_mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(lock_obj.fileno(), lock_mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not wait:
+                lock_obj.close()
+                return False
+            print("Waiting for another session to finish with the order files...")
+            fcntl.flock(lock_obj.fileno(), lock_mode)
+    storage_lock = [lock_obj, exclusive, 1]
+    return True
+
+# Function to release the lock taken by acquire_storage_lock
+def release_storage_lock():
+    global storage_lock
+    storage_lock[2] -= 1
+    if storage_lock[2] == 0:
+        lock_obj = storage_lock[0]
+        storage_lock = None
+        if fcntl is not None:
+            fcntl.flock(lock_obj.fileno(), fcntl.LOCK_UN)
+        lock_obj.close()
+
+# Function to make a decorator that runs an operation under the storage lock
+def storage_locked(exclusive):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            acquire_storage_lock(exclusive)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                release_storage_lock()
+        return wrapper
+    return decorator
+
+# Function to read the version stamp of the order files as (save count, rewrite count)
+def read_version_stamp():
+    try:
+        with open(version_file_name) as version_obj:
+            saves, rewrites = version_obj.read().split()
+        return int(saves), int(rewrites)
+    except FileNotFoundError:
+        return 0, 0
+
+# Function to move the version stamp on after the order files were written
+# 'rewritten' is True when the files were rewritten instead of appended to, so the
+# journal no longer shows the changes made before. Records that were up to date
+# stay up to date, since the change was made by this session.
+def stamp_storage_change(rewritten=False):
+    global loaded_version
+    stamp = read_version_stamp()
+    new_stamp = (stamp[0] + 1, stamp[1] + (1 if rewritten else 0))
+    with open(version_file_name + '.tmp', mode='w') as version_obj:
+        version_obj.write(f"{new_stamp[0]} {new_stamp[1]}\n")
+    sync_file(version_file_name + '.tmp')
+    os.replace(version_file_name + '.tmp', version_file_name)
+    if loaded_version == stamp:
+        loaded_version = new_stamp
+
+# Function to check the pending changes against the changes other sessions saved
+# since the records were loaded (optimistic versioning)
+# The other sessions' journal changes are merged into memory when none of them touch
+# an order this session deleted or updated. New orders never clash, as their Order IDs
+# are reserved. Returns True if the save can go ahead; otherwise the reason is printed.
+def merge_other_sessions():
+    global loaded_version
+    global journal_end_offset
+    global journal_op_count
+    stamp = read_version_stamp()
+    if not records_loaded or loaded_version is None or stamp == loaded_version:
+        return True
+
+    changed_ids = {change[1] for change in pending_changes if change[0] != 'A'}
+    if save_conflict_mode == 'reject':
+        reason = "another session saved changes since the records were loaded"
+    elif storage_backend == 'csv' and stamp[1] == loaded_version[1]:
+        # The journal still holds every change saved since the last load or refresh
+        ops, end_offset = read_journal(journal_end_offset)
+        conflicts = sorted(changed_ids & {op[1] if op[0] == 'D' else op[1][0] for op in ops})
+        if not conflicts:
+            for op in ops:
+                apply_journal_op(op)
+            journal_end_offset = end_offset
+            journal_op_count += len(ops)
+            loaded_version = stamp
+            if ops:
+                print(f"\n{len(ops)} changes saved by other sessions merged into memory.")
+            return True
+        reason = "another session also changed Order ID(s) " + ", ".join(map(str, conflicts[:10]))
+    elif not changed_ids:
+        return True
+    else:
+        reason = ("the order files were rewritten by another session, "
+                  "so deletes and status updates cannot be checked")
+
+    print(f"\nSave rejected: {reason}.")
+    print("Your changes are still in memory. Refresh the records to see the other changes, then save again.")
+    return False
+
+# Function to reserve new Order IDs
+# The highest Order ID handed out is kept in the OrderDetails.lastid file, so
+# getting the next ID does not read the CSV file. The file is locked while it is
+# read and updated, so several processes never receive the same ID.
+# Returns the first of 'count' reserved IDs, or None on error.
+@instrumented
+def new_last_row_id(count=1):
+    try:
+        id_fd = os.open(id_file_name, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(id_fd, mode='r+') as id_file_obj:
+            lock_id_file(id_file_obj, True)
+            try:
+                saved_id = id_file_obj.read().strip()
+
+                # Never go below the last ID in storage or in memory, in case
+                # rows were added without updating the high-water mark (a compressed
+                # CSV file is only read when there is no high-water mark yet)
+                if storage_backend == 'sqlite':
+                    last_id = database_last_order_id()
+                elif storage_backend == 'partitions':
+                    last_id = max((entry["last_id"] for entry in read_manifest().values()),
+                                  default=first_order_id - 1)
+                elif saved_id and file_compression(file_name):
+                    last_id = first_order_id - 1
+                else:
+                    last_id = read_last_order_id()
+                if saved_id:
+                    last_id = max(last_id, int(saved_id))
+                elif storage_backend == 'csv':
+                    # No high-water mark yet: orders saved to the journal may not be in the CSV file
+                    for op in read_journal()[0]:
+                        if op[0] == 'A':
+                            last_id = max(last_id, op[1][0])
+                if order_id:
+                    last_id = max(last_id, order_id[-1])
+
+                # Auto-generate the new Order IDs and store the new high-water mark
+                get_new_order_id = last_id + 1
+                id_file_obj.seek(0)
+                id_file_obj.truncate()
+                count_stat('bytes_written', id_file_obj.write(str(last_id + count)))
+                id_file_obj.flush()
+                os.fsync(id_file_obj.fileno())
+            finally:
+                lock_id_file(id_file_obj, False)
 
         return get_new_order_id
 
@@ -65,8 +610,8 @@ def new_last_row_id():
 # Function to check for empty array before performing display / delete / save operations
 def check_empty():
 
-    # Check for empty array
-    if not order_id:
+    # Check for empty array (tombstoned rows do not count as records)
+    if not order_index:
         print("No records found. Please add or load records first.")
         return True  # It is empty
     return False     # It is not empty
@@ -75,30 +620,1864 @@ def check_empty():
 def clear_array():
     global records_loaded
     global records_not_saved
-    order_id.clear()
-    customer_name.clear()
-    item_purchased.clear()
-    quantity.clear()
-    order_date.clear()
-    total_price.clear()
-    order_status.clear()
+    for column in order_columns:
+        del column[:]
+    for table in (customer_name_table, customer_name_codes, customer_name_lower,
+                  item_purchased_table, item_purchased_codes, item_purchased_lower,
+                  order_status_table, order_status_codes, order_status_lower):
+        table.clear()
+    order_index.clear()
+    deleted_rows.clear()
+    pending_changes.clear()
+    clear_secondary_indexes()
     records_loaded = False
     records_not_saved = False
 
+# Function to get the code of a value in a dictionary-encoded column, adding it if new
+# A new value is also added to 'lower_codes' (lower-case value -> codes) when it is given.
+def encode_value(table, codes, value, lower_codes=None):
+    code = codes.get(value)
+    if code is None:
+        code = len(table)
+        table.append(value)
+        codes[value] = code
+        if lower_codes is not None:
+            lower_codes.setdefault(value.lower(), []).append(code)
+    return code
+
+# Function to convert a DD/MM/YYYY date into a day ordinal
+# Each distinct date text is parsed once and then found in date_cache.
+def parse_date(date_text):
+    day = date_cache.get(date_text)
+    if day is None:
+        day = datetime.datetime.strptime(date_text, date_format).toordinal()
+        if len(date_cache) >= date_cache_limit:
+            date_cache.clear()
+        date_cache[date_text] = day
+    return day
+
+# Function to convert a day ordinal back into a DD/MM/YYYY date
+# Each distinct day is formatted once and then found in date_text_cache.
+def format_date(day):
+    date_text = date_text_cache.get(day)
+    if date_text is None:
+        date_text = datetime.date.fromordinal(day).strftime(date_format)
+        if len(date_text_cache) >= date_cache_limit:
+            date_text_cache.clear()
+        date_text_cache[day] = date_text
+    return date_text
+
+# Function to append one order to the parallel arrays and register it in the Order ID index
+# Takes the same plain values as a CSV row; text and date columns are encoded here.
+def append_row(new_order_id, name, item, qty, date, price, status):
+    index = len(order_id)
+    order_id.append(new_order_id)
+    customer_name.append(encode_value(customer_name_table, customer_name_codes, name, customer_name_lower))
+    item_purchased.append(encode_value(item_purchased_table, item_purchased_codes, item, item_purchased_lower))
+    quantity.append(qty)
+    order_date.append(parse_date(date))
+    total_price.append(price)
+    order_status.append(encode_value(order_status_table, order_status_codes, status, order_status_lower))
+    order_index[new_order_id] = index
+    if indexes_ready:
+        index_row(index)
+    return index
+
+# Function to overwrite an existing row with plain values (same layout as a CSV row)
+# The old index entries are counted as stale once the new values are indexed, so a
+# purge rebuilds the indexes from the new values.
+def replace_row(index, row):
+    if indexes_ready:
+        summarize_row(index, -1)
+    customer_name[index] = encode_value(customer_name_table, customer_name_codes, row[1], customer_name_lower)
+    item_purchased[index] = encode_value(item_purchased_table, item_purchased_codes, row[2], item_purchased_lower)
+    quantity[index] = row[3]
+    order_date[index] = parse_date(row[4])
+    total_price[index] = row[5]
+    order_status[index] = encode_value(order_status_table, order_status_codes, row[6], order_status_lower)
+    if indexes_ready:
+        index_row(index)
+        note_stale_entries(1)
+
+# Function to change the status of one row, keeping the status index up to date
+def set_row_status(index, status):
+    code = encode_value(order_status_table, order_status_codes, status, order_status_lower)
+    old_code = order_status[index]
+    if indexes_ready:
+        summarize_row(index, -1)
+    order_status[index] = code
+    if indexes_ready:
+        summarize_row(index, 1)
+        # Counted after the change, so a purge this starts keeps the new entry
+        if code != old_code:
+            status_index.setdefault(code, array('q')).append(order_id[index])
+            note_stale_entries(1)
+
+# Function to get one row as plain values (same layout as a CSV row)
+def get_row(index):
+    return (order_id[index],
+            customer_name_table[customer_name[index]],
+            item_purchased_table[item_purchased[index]],
+            quantity[index],
+            format_date(order_date[index]),
+            total_price[index],
+            order_status_table[order_status[index]])
+
+# Function to find the row position of an Order ID (None if not found or deleted)
+def find_row(find_order_id):
+    return order_index.get(find_order_id)
+
+# Function to delete a row by marking it as a tombstone
+# The row stays in the parallel arrays until the next compaction, so a delete
+# costs O(1) instead of shifting every column.
+# 'compact' False leaves the compaction to the caller (used by batch deletes).
+def remove_row(index, compact=True):
+    del order_index[order_id[index]]
+    deleted_rows.add(index)
+    # Only after the row has left order_index, so a purge this starts drops its entries
+    if indexes_ready:
+        unindex_row(index)
+
+    # Compact once enough of the arrays is made up of deleted rows
+    if compact and len(deleted_rows) >= compact_min_rows and len(deleted_rows) >= len(order_id) * compact_ratio:
+        compact_records()
+
+# Function to compact the parallel arrays
+# Drops all tombstoned rows in a single pass and rebuilds the Order ID index.
+def compact_records():
+    if not deleted_rows:
+        return
+
+    keep = [i for i in range(len(order_id)) if i not in deleted_rows]
+
+    # Rebuild every column in place so other references to the arrays stay valid
+    for column in order_columns:
+        column[:] = array(column.typecode, [column[i] for i in keep])
+
+    deleted_rows.clear()
+    rebuild_index()
+    if indexes_ready and stale_index_entries:
+        purge_secondary_indexes()
+
+# Function to rebuild the Order ID index from the order_id array
+def rebuild_index():
+    order_index.clear()
+    for i in range(len(order_id)):
+        order_index[order_id[i]] = i
+
+# Function to switch incremental maintenance of the secondary indexes on or off
+# Switch it off before adding many rows and call build_secondary_indexes() afterwards.
+def set_indexes_ready(ready):
+    global indexes_ready
+    indexes_ready = ready
+
+# Function to empty the secondary indexes (they then match the empty arrays)
+def clear_secondary_indexes():
+    global indexes_ready
+    global stale_index_entries
+    stale_index_entries = 0
+    customer_index.clear()
+    item_index.clear()
+    status_index.clear()
+    del date_index_days[:]
+    del date_index_ids[:]
+    summary_status.clear()
+    summary_items.clear()
+    indexes_ready = True
+
+# Function to find where an order belongs in the sorted date index
+def date_index_position(day, find_order_id):
+    low = bisect.bisect_left(date_index_days, day)
+    high = bisect.bisect_right(date_index_days, day, low)
+    return bisect.bisect_left(date_index_ids, find_order_id, low, high)
+
+# Function to add one row to the secondary indexes
+def index_row(index):
+    row_order_id = order_id[index]
+    index_postings(index)
+    summarize_row(index, 1)
+
+    # New orders usually have the latest date, so this is normally an append.
+    # An order changed back to a date it had before still has its old entry.
+    position = date_index_position(order_date[index], row_order_id)
+    if position == len(date_index_ids) or date_index_ids[position] != row_order_id \
+            or date_index_days[position] != order_date[index]:
+        date_index_days.insert(position, order_date[index])
+        date_index_ids.insert(position, row_order_id)
+
+# Function to add one row to the inverted indexes
+def index_postings(index):
+    row_order_id = order_id[index]
+    for column, postings in ((customer_name, customer_index), (item_purchased, item_index),
+                             (order_status, status_index)):
+        matches = postings.get(column[index])
+        if matches is None:
+            matches = postings[column[index]] = array('q')
+        # A changed row whose value did not change keeps its entry
+        if not matches or matches[-1] != row_order_id:
+            matches.append(row_order_id)
+
+# Function to remove one deleted row from the secondary indexes
+# Its index entries stay until the next purge and are skipped by lookups. The row must
+# already be out of order_index (see note_stale_entries).
+def unindex_row(index):
+    summarize_row(index, -1)
+    note_stale_entries(1)
+
+# Function to remove many deleted rows from the secondary indexes
+def unindex_rows(rows):
+    for index in rows:
+        summarize_row(index, -1)
+    note_stale_entries(len(rows))
+
+# Function to count rows with stale index entries and purge them once there are enough
+# Call it after the rows were changed or taken out of order_index: the purge rebuilds
+# the indexes from order_index and the columns as they are at that moment.
+def note_stale_entries(count):
+    global stale_index_entries
+    stale_index_entries += count
+    if stale_index_entries >= compact_min_rows and stale_index_entries >= len(order_index) * compact_ratio:
+        purge_secondary_indexes()
+
+# Function to check whether an index entry still matches its order
+def index_entry_live(entry_order_id, column, code):
+    index = order_index.get(entry_order_id)
+    return index is not None and column[index] == code
+
+# Function to drop the stale entries from the secondary indexes in one pass
+# The inverted indexes are rebuilt from the columns and the date index is filtered,
+# so no sort is needed.
+def purge_secondary_indexes():
+    global stale_index_entries
+    customer_index.clear()
+    item_index.clear()
+    status_index.clear()
+    for i in sorted(order_index.values()):
+        index_postings(i)
+
+    keep = [j for j in range(len(date_index_ids))
+            if index_entry_live(date_index_ids[j], order_date, date_index_days[j])]
+    date_index_days[:] = array('i', [date_index_days[j] for j in keep])
+    date_index_ids[:] = array('q', [date_index_ids[j] for j in keep])
+    stale_index_entries = 0
+
+# Function to build the secondary indexes for all live rows in one pass
+# Used after a load instead of updating the indexes row by row.
+def build_secondary_indexes():
+    global indexes_ready
+    clear_secondary_indexes()
+    rebuild_summary()
+    rows = sorted(order_index.values())
+    for i in rows:
+        index_postings(i)
+
+    # Sort by Order ID and then (stable) by date, giving (day, Order ID) order
+    rows.sort(key=order_id.__getitem__)
+    rows.sort(key=order_date.__getitem__)
+    date_index_days.extend(order_date[i] for i in rows)
+    date_index_ids.extend(order_id[i] for i in rows)
+    indexes_ready = True
+
+# Function to add (sign 1) or take away (sign -1) one row in the summary cache
+def summarize_row(index, sign):
+    totals = summary_status.get(order_status[index])
+    if totals is None:
+        totals = summary_status[order_status[index]] = [0, 0, 0.0]
+    totals[0] += sign
+    totals[1] += sign * quantity[index]
+    totals[2] += sign * total_price[index]
+    summary_items[item_purchased[index]] = summary_items.get(item_purchased[index], 0) + sign
+
+# Function to rebuild the summary cache from the live rows in one pass
+def rebuild_summary():
+    summary_status.clear()
+    summary_items.clear()
+    for code, count, qty, revenue in group_totals(order_status):
+        summary_status[code] = [count, qty, revenue]
+    for code, count, qty, revenue in group_totals(item_purchased):
+        summary_items[code] = count
+
+# Function to get the running totals of the live orders from the summary cache
+# Returns a dictionary with the order count, quantity and revenue overall and per
+# status, and the order count per item. Costs O(statuses + items), not O(orders).
+def order_summary():
+    statuses = {order_status_table[code]: {"orders": count, "quantity": qty, "revenue": round(revenue, 2)}
+                for code, (count, qty, revenue) in summary_status.items() if count}
+    return {"orders": sum(entry["orders"] for entry in statuses.values()),
+            "quantity": sum(entry["quantity"] for entry in statuses.values()),
+            "revenue": round(sum(entry["revenue"] for entry in statuses.values()), 2),
+            "statuses": statuses,
+            "items": {item_purchased_table[code]: count for code, count in summary_items.items() if count}}
+
+# Function to check the summary cache against a full recompute from the columns
+# Revenue may differ by rounding only. Returns a list of differences (empty if consistent).
+def verify_summary():
+    cached = order_summary()
+    fresh_status = {order_status_table[code]: (count, qty, revenue)
+                    for code, count, qty, revenue in group_totals(order_status)}
+    fresh_items = {item_purchased_table[code]: count
+                   for code, count, qty, revenue in group_totals(item_purchased)}
+
+    differences = []
+    for status in sorted(cached["statuses"].keys() | fresh_status.keys()):
+        entry = cached["statuses"].get(status, {"orders": 0, "quantity": 0, "revenue": 0.0})
+        count, qty, revenue = fresh_status.get(status, (0, 0, 0.0))
+        if (entry["orders"], entry["quantity"]) != (count, qty) or abs(entry["revenue"] - revenue) > 0.01:
+            differences.append(f"status {status}: cached {entry['orders']} orders, {entry['quantity']} items, "
+                               f"${entry['revenue']:.2f}; actual {count} orders, {qty} items, ${revenue:.2f}")
+    for item in sorted(cached["items"].keys() | fresh_items.keys()):
+        if cached["items"].get(item, 0) != fresh_items.get(item, 0):
+            differences.append(f"item {item}: cached {cached['items'].get(item, 0)} orders, "
+                               f"actual {fresh_items.get(item, 0)}")
+    return differences
+
+# Function to format the summary cache as the main menu header lines
+def format_summary():
+    summary = order_summary()
+    lines = [f"Orders: {summary['orders']}  Quantity: {summary['quantity']}  Revenue: ${summary['revenue']:,.2f}"]
+    if summary["statuses"]:
+        lines.append("  ".join(f"{status}: {entry['orders']} (${entry['revenue']:,.2f})"
+                               for status, entry in sorted(summary["statuses"].items())))
+    top_items = sorted(summary["items"].items(), key=lambda entry: entry[1], reverse=True)[:summary_top_items]
+    if top_items:
+        lines.append("Top items: " + ", ".join(f"{item} ({count})" for item, count in top_items))
+    return "\n".join(lines)
+
+# Function to find the codes of a text value, ignoring upper/lower case
+# 'lower_codes' is the lower-case lookup of the column (such as customer_name_lower).
+def matching_codes(lower_codes, value):
+    return lower_codes.get(value.strip().lower(), [])
+
+# Function to scan a range of order dates through the sorted date index
+# Dates are DD/MM/YYYY strings (None = open end) and the range is inclusive. Costs
+# O(log n) to find the range plus one step per match. Returns the row positions in
+# date order (then Order ID order), newest first when 'descending' is True.
+def date_range_rows(date_from=None, date_to=None, descending=False):
+    low = bisect.bisect_left(date_index_days, parse_date(date_from)) if date_from else 0
+    high = bisect.bisect_right(date_index_days, parse_date(date_to)) if date_to else len(date_index_days)
+    rows = [order_index[date_index_ids[j]] for j in range(low, high)
+            if index_entry_live(date_index_ids[j], order_date, date_index_days[j])]
+    if descending:
+        rows.reverse()
+    return rows
+
+# Function to sort row positions by order date (then Order ID)
+# 'order' is 'id' (leave in table order), 'date' (oldest first) or 'newest'.
+def sort_rows(rows, order):
+    if order == 'date':
+        rows.sort(key=lambda i: (order_date[i], order_id[i]))
+    elif order == 'newest':
+        rows.sort(key=lambda i: (order_date[i], order_id[i]), reverse=True)
+    return rows
+
+# Function to sort rows given as plain values (such as stream_query results) the same way
+def sort_plain_rows(rows, order):
+    if order in ('date', 'newest'):
+        rows.sort(key=lambda row: (parse_date(row[4]), row[0]), reverse=order == 'newest')
+    return rows
+
+# Function to query records through the secondary indexes
+# Every given filter must match; dates are DD/MM/YYYY strings and the range is inclusive.
+# Returns the row positions of the matching orders in table order.
+def query_records(customer=None, item=None, status=None, date_from=None, date_to=None):
+    filters = []  # (column, matching codes, index entries of those codes)
+
+    # Look up the codes of each text filter in its inverted index
+    for value, lower_codes, column, index in ((customer, customer_name_lower, customer_name, customer_index),
+                                              (item, item_purchased_lower, item_purchased, item_index),
+                                              (status, order_status_lower, order_status, status_index)):
+        if value:
+            codes = matching_codes(lower_codes, value)
+            filters.append((column, set(codes), [index[code] for code in codes if code in index]))
+
+    first_day = parse_date(date_from) if date_from else None
+    last_day = parse_date(date_to) if date_to else None
+
+    if not filters:
+        if first_day is None and last_day is None:
+            return sorted(order_index.values())
+
+        # Only a date range: slice the sorted date index
+        return sorted(date_range_rows(date_from, date_to))
+
+    # Walk the shortest list of entries and check every filter on the columns of
+    # those orders directly; this also skips stale entries
+    filters.sort(key=lambda entry: sum(len(matches) for matches in entry[2]))
+    rows = set()
+    for matches in filters[0][2]:
+        for match_id in matches:
+            i = order_index.get(match_id)
+            if i is not None and all(column[i] in codes for column, codes, entries in filters):
+                rows.add(i)
+
+    # Check the date range on the few remaining orders directly
+    rows = sorted(rows)
+    if first_day is not None:
+        rows = [i for i in rows if order_date[i] >= first_day]
+    if last_day is not None:
+        rows = [i for i in rows if order_date[i] <= last_day]
+    return rows
+
+# Function to check one CSV row and convert it into typed column values
+# Raises ValueError with the reason when a field is missing or not valid.
+def parse_row(row):
+    if len(row) != len(order_fields):
+        raise ValueError(f"{len(row)} fields instead of {len(order_fields)}")
+    try:
+        row_order_id = int(row[0])
+    except ValueError:
+        raise ValueError(f"Order ID '{row[0]}' is not an integer") from None
+    if not row[1] or not row[2]:
+        raise ValueError("customer name or item purchased is empty")
+    try:
+        qty = int(row[3])
+    except ValueError:
+        raise ValueError(f"quantity '{row[3]}' is not an integer") from None
+    try:
+        parse_date(row[4])
+    except ValueError:
+        raise ValueError(f"order date '{row[4]}' is not in DD/MM/YYYY format") from None
+    try:
+        price = float(row[5])
+    except ValueError:
+        raise ValueError(f"total price '{row[5]}' is not a number") from None
+    if row[6] not in valid_statuses:
+        raise ValueError(f"status '{row[6]}' is not Shipped, Delivered or Cancelled")
+    return (row_order_id, row[1], row[2], qty, row[4], price, row[6])
+
+# Function to find the column of each order field from the header row of an order file
+# Header names are matched through the aliases in import_field_names, so 'Qty' and
+# 'Quantity' or 'Total($)' and 'Total_Price ($)' name the same column. Returns the
+# positions to pass to iter_record_chunks, or None when the columns are in the usual
+# order or the header does not name all of them (see header_recognised).
+def header_positions(header):
+    keys = [import_field_key(name) for name in header or ()]
+    if keys[:len(order_fields)] == list(order_fields) or not header_recognised(header):
+        return None
+    return [keys.index(field) for field in order_fields]
+
+# Function to check whether a header row names every order field
+def header_recognised(header):
+    return set(order_fields) <= {import_field_key(name) for name in header or ()}
+
+# Function to read CSV rows in batches
+# Parses up to 'chunk_size' rows at a time from an open csv reader (positioned after
+# the header) and yields each batch as a list of row tuples, so only one batch
+# is held in memory at a time. Blank lines are skipped. Rows that are not valid
+# orders are counted as parse errors and added to 'rejects' as (line number, reason,
+# fields); without a 'rejects' list the first one raises ValueError instead.
+# 'positions' reorders the fields of each row (see header_positions).
+def iter_record_chunks(csv_reader, chunk_size, rejects=None, positions=None):
+    chunk = []
+    for row in csv_reader:
+        if not row:
+            continue
+        if positions and len(row) > max(positions):
+            row = [row[position] for position in positions]
+        try:
+            chunk.append(parse_row(row))
+        except ValueError as e:
+            count_stat('parse_errors')
+            if rejects is None:
+                raise ValueError(f"line {csv_reader.line_num}: {e}") from None
+            rejects.append((csv_reader.line_num, str(e), row))
+            continue
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Function to get the name of the quarantine file for rows of an order file that are not valid
+def reject_file_name(source_name):
+    return source_name + '.rejects.csv'
+
+# Function to write rejected rows with their line numbers and reasons
+# 'rejects' holds (line number, reason, fields...) entries; 'header' names the fields.
+# 'append' adds to an existing file instead of replacing it.
+def write_rejects(rejects_name, rejects, header, append=False):
+    new_file = not append or not os.path.exists(rejects_name)
+    with open(rejects_name, mode='w' if new_file else 'a', newline='') as reject_obj:
+        reject_writer = csv.writer(reject_obj)
+        if new_file:
+            reject_writer.writerow(["Line", "Reason", *header])
+        for line_number, reason, *fields in rejects:
+            reject_writer.writerow([line_number, reason, *(fields[0] if fields else ())])
+
+# Function to list the first rejected rows on screen
+def print_rejects(rejects, rejects_name, action="rejected"):
+    print(f"{len(rejects)} rows {action} (details in '{rejects_name}'):")
+    for line_number, reason, *fields in rejects[:10]:
+        print(f"  Line {line_number}: {reason}")
+    if len(rejects) > 10:
+        print(f"  ... and {len(rejects) - 10} more.")
+
+# Function to quarantine the rows of an order file that are not valid orders
+# The rows are written to the file's rejects file and listed; when there are none,
+# an old rejects file from an earlier load is removed. Rows with all their fields
+# are in the usual column order (see iter_record_chunks), under csv_header.
+def quarantine_rows(source_name, rejects, header, append=False):
+    rejects_name = reject_file_name(source_name)
+    if rejects:
+        write_rejects(rejects_name, rejects, csv_header if header_positions(header) or not header else header,
+                      append)
+        print_rejects(rejects, rejects_name, f"of '{source_name}' skipped as not valid")
+    elif not append and os.path.exists(rejects_name):
+        os.remove(rejects_name)
+
+# Function to stream order records straight from the CSV file without loading them
+# Yields batches of row tuples (see iter_record_chunks) for queries and reports when
+# nothing is loaded. The committed journal changes are applied on the way, so the rows
+# are the ones a load would give. Rows that are not valid orders are skipped, or added
+# to 'rejects' when it is given.
+def stream_records(chunk_size=None, rejects=None):
+    chunk_size = chunk_size or load_chunk_size
+    changes = fold_changes(read_journal()[0])
+    chunk = []
+    with open_order_file(file_name) as csv_file_obj:
+        csv_reader = csv.reader(csv_file_obj)
+        positions = header_positions(next(csv_reader, None))
+        for row in apply_changes(csv_reader, changes, [] if rejects is None else rejects, positions):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+    # Orders added through the journal come after the rows of the file
+    for row in changes.values():
+        if isinstance(row, tuple):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+# Function to stream the stored orders of the current backend without loading them
+# The CSV file is read with its journal; partitions are read month by month, and
+# 'months' limits them to the ones a query can match (None reads every partition).
+def stream_storage(chunk_size=None, months=None):
+    if storage_backend == 'partitions':
+        return stream_partitions(select_partitions() if months is None else months, chunk_size)
+    return stream_records(chunk_size)
+
+# Function to stream only the rows that match a filter
+# 'predicate' is called with each row tuple and the row is yielded when it returns True.
+def stream_filter(predicate, chunk_size=None, months=None):
+    for chunk in stream_storage(chunk_size, months):
+        for row in chunk:
+            if predicate(row):
+                yield row
+
+# Function to query the stored orders without loading them (the same filters as query_records)
+# The CSV file and the partitions are read in one streaming pass; the database is queried
+# directly. Returns the matching rows (plain values) in Order ID order (file order for CSV).
+def stream_query(customer=None, item=None, status=None, date_from=None, date_to=None):
+    if storage_backend == 'sqlite':
+        return database_query(customer, item, status, date_from, date_to)
+    months = select_partitions(date_from, date_to, status) if storage_backend == 'partitions' else None
+    customer, item, status = (value.strip().lower() if value else None for value in (customer, item, status))
+    first_day = parse_date(date_from) if date_from else None
+    last_day = parse_date(date_to) if date_to else None
+
+    def matches(row):
+        if customer and row[1].lower() != customer or item and row[2].lower() != item \
+                or status and row[6].lower() != status:
+            return False
+        if first_day is not None or last_day is not None:
+            day = parse_date(row[4])
+            return (first_day is None or day >= first_day) and (last_day is None or day <= last_day)
+        return True
+
+    rows = list(stream_filter(matches, months=months))
+    if months is not None:
+        # Partitions are read month by month, so their rows are not in Order ID order
+        rows.sort()
+    return rows
+
+# Function to compute order totals per group from the stored orders without loading them
+# The CSV file and the partitions are totalled in a single streaming pass and the database
+# with one GROUP BY query. 'group_by' is 'status', 'item', 'customer' or 'day'. Returns a
+# list of (label, order count, total quantity, total revenue), days in date order.
+def stream_totals(group_by, chunk_size=None):
+    if storage_backend == 'sqlite':
+        return database_totals(group_by)
+    position = {'customer': 1, 'item': 2, 'day': 4, 'status': 6}[group_by]
+    totals = {}
+    for chunk in stream_storage(chunk_size):
+        for row in chunk:
+            key = parse_date(row[4]) if group_by == 'day' else row[position]
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = [0, 0, 0.0]
+            entry[0] += 1
+            entry[1] += row[3]
+            entry[2] += row[5]
+    if group_by == 'day':
+        return [(format_date(day), *totals[day]) for day in sorted(totals)]
+    return [(label, *entry) for label, entry in totals.items()]
+
+# Function to keep only the most recent 'window' orders in the parallel arrays
+def trim_to_window(window):
+    compact_records()
+    excess = len(order_id) - window
+    if excess <= 0:
+        return
+
+    for column in order_columns:
+        del column[:excess]
+
+    rebuild_index()
+    if indexes_ready:
+        build_secondary_indexes()
+
+# Function to report the peak memory (resident set size) of this process
+def peak_memory_text():
+    if resource is None:
+        return "not available on this platform"
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        peak = peak / 1024
+    return f"{peak / 1024:.1f} MB"
+
+# Function to read the committed operations from the journal file
+# Each save writes one batch of 'A' (add), 'D' (delete) and 'U' (status update)
+# lines followed by a 'C' (commit) line holding the number of lines in the batch.
+# Lines after the last commit line belong to a save that did not finish (for example
+# a crash during the write) and are ignored; a batch whose line count does not match
+# its commit line is damaged and ignored as well.
+# Reading starts at byte 'start_offset'. Returns the list of operations and the
+# byte offset just after the last commit line.
+def read_journal(start_offset=0):
+    committed = []
+    batch = []
+    batch_lines = 0
+    end_offset = start_offset
+    position = start_offset
+    try:
+        with open(journal_file_name, mode='rb') as journal_obj:
+            journal_obj.seek(start_offset)
+            for line in journal_obj:
+                position += len(line)
+                entry = next(csv.reader([line.decode()]), None)
+                if not entry:
+                    continue
+                if entry[0] == 'C':
+                    if len(entry) == 2 and entry[1] == str(batch_lines):
+                        committed.extend(batch)
+                    else:
+                        count_stat('parse_errors')
+                    batch = []
+                    batch_lines = 0
+                    end_offset = position
+                    continue
+                batch_lines += 1
+                if entry[0] == 'A' and len(entry) == 8:
+                    try:
+                        batch.append(('A', parse_row(entry[1:])))
+                    except ValueError:
+                        count_stat('parse_errors')
+                elif entry[0] == 'D' and len(entry) == 2:
+                    batch.append(('D', int(entry[1])))
+                elif entry[0] == 'U' and len(entry) == 3:
+                    batch.append(('U', (int(entry[1]), entry[2])))
+                else:
+                    count_stat('parse_errors')
+    except FileNotFoundError:
+        pass
+    count_stat('bytes_read', position - start_offset)
+    return committed, end_offset
+
+# Function to apply one journal operation to the parallel arrays
+# Replaying is idempotent: an add for an existing Order ID overwrites that row and
+# a delete or status update for a missing Order ID is skipped.
+def apply_journal_op(op):
+    if op[0] == 'A':
+        row = op[1]
+        index = find_row(row[0])
+        if index is None:
+            append_row(*row)
+        else:
+            replace_row(index, row)
+    elif op[0] == 'D':
+        index = find_row(op[1])
+        if index is not None:
+            remove_row(index)
+    elif op[0] == 'U':
+        index = find_row(op[1][0])
+        if index is not None:
+            set_row_status(index, op[1][1])
+
+# Function to replay the journal file on top of the loaded records
+# 'start_offset' skips the part of the journal that is already in a snapshot.
+def replay_journal(start_offset=0):
+    global journal_op_count
+    global journal_end_offset
+    ops, journal_end_offset = read_journal(start_offset)
+    for op in ops:
+        apply_journal_op(op)
+    journal_op_count = len(ops)
+    return len(ops)
+
+# Function to append the pending changes to the journal as one committed batch
+# The batch is flushed and fsynced before returning, so a save costs O(changes).
+# Called with the storage lock held, so no other session is writing the journal.
+def write_journal_batch():
+    global journal_op_count
+    global journal_end_offset
+    truncate_journal()
+    with open(journal_file_name, mode='a', newline='') as journal_obj:
+        start_offset = journal_obj.tell()
+        journal_writer = csv.writer(journal_obj)
+        journal_writer.writerows(pending_changes)
+        journal_writer.writerow(['C', len(pending_changes)])
+        journal_obj.flush()
+        os.fsync(journal_obj.fileno())
+        # Batches other sessions wrote since the last replay stay unread, so the
+        # next refresh replays them (and this batch again, which is harmless)
+        if start_offset == journal_end_offset:
+            journal_end_offset = journal_obj.tell()
+        count_stat('bytes_written', journal_obj.tell() - start_offset)
+    journal_op_count += len(pending_changes)
+    pending_changes.clear()
+
+# Function to cut the journal back to its last commit line
+# Lines left by a save that did not finish would otherwise be committed by the
+# commit line of the next batch. Only the part written since the last replay is
+# read, unless the journal was rewritten since then.
+def truncate_journal():
+    try:
+        journal_size = os.path.getsize(journal_file_name)
+    except FileNotFoundError:
+        return
+    start_offset = journal_end_offset
+    if journal_size < start_offset or loaded_version is None or read_version_stamp()[1] != loaded_version[1]:
+        start_offset = 0
+    committed_end = read_journal(start_offset)[1]
+    if journal_size > committed_end:
+        print(f"\nNOTE: {journal_size - committed_end} bytes of an unfinished save removed from '{journal_file_name}'.")
+        os.truncate(journal_file_name, committed_end)
+
+# Function to get the pending changes as journal operations (as returned by read_journal)
+def pending_ops():
+    return [('A', tuple(change[1:])) if change[0] == 'A' else
+            ('D', change[1]) if change[0] == 'D' else ('U', (change[1], change[2]))
+            for change in pending_changes]
+
+# Function to work out the final state of every Order ID touched by journal operations
+# Returns a dictionary of Order ID -> the whole row, None when deleted, or just the
+# new status for a row that is only in the file.
+def fold_changes(ops):
+    changes = {}
+    for op in ops:
+        if op[0] == 'A':
+            changes[op[1][0]] = op[1]
+        elif op[0] == 'D':
+            changes[op[1]] = None
+        else:
+            change_id, status = op[1]
+            change = changes.get(change_id, status)
+            if isinstance(change, tuple):
+                changes[change_id] = change[:6] + (status,)
+            elif change is not None:
+                changes[change_id] = status
+    return changes
+
+# Function to apply folded changes (see fold_changes) to the rows of an order file
+# Yields the resulting rows in file order. Changed rows are taken out of 'changes',
+# so the orders left in it afterwards were not in the file. Rows that are not valid
+# orders are added to 'rejects' (see iter_record_chunks).
+def apply_changes(csv_reader, changes, rejects, positions=None):
+    for chunk in iter_record_chunks(csv_reader, load_chunk_size, rejects, positions):
+        for row in chunk:
+            if row[0] in changes:
+                change = changes.pop(row[0])
+                if change is None:
+                    continue
+                row = row[:6] + (change,) if isinstance(change, str) else change
+            yield row
+
+# Function to fold the journal into a fresh CSV file
+# Streams the CSV file, applies the committed journal operations on the way and
+# writes the result to a temporary file that then replaces the CSV file in one step.
+# Only the journal has to fit in memory, so this also works after a window mode load.
+def compact_storage():
+    changes = fold_changes(read_journal()[0])
+
+    temp_file_name = file_name + '.tmp'
+    row_count = 0
+    count_stat('bytes_read', os.path.getsize(file_name))
+    with open_order_file(file_name) as csv_file_obj, \
+            open_order_file(temp_file_name, 'w', file_compression(file_name)) as temp_file_obj:
+        csv_reader = csv.reader(csv_file_obj)
+        csv_writer = csv.writer(temp_file_obj)
+
+        # Keep the header of the existing file, unless its columns are being put in the usual order
+        header = next(csv_reader, None)
+        positions = header_positions(header)
+        csv_writer.writerow(csv_header if positions or not header else header)
+
+        rejects = []
+        for row in apply_changes(csv_reader, changes, rejects, positions):
+            csv_writer.writerow(row)
+            row_count += 1
+
+        # Orders added through the journal go at the end of the file
+        for row in changes.values():
+            if isinstance(row, tuple):
+                csv_writer.writerow(row)
+                row_count += 1
+
+        # Rows that are not valid orders are kept as they are, so nothing is lost
+        for line_number, reason, row in rejects:
+            csv_writer.writerow(row)
+
+    sync_file(temp_file_name)
+    count_stat('bytes_written', os.path.getsize(temp_file_name))
+    os.replace(temp_file_name, file_name)
+
+    # The CSV file now holds every change, so start a new empty journal
+    clear_journal()
+    stamp_storage_change(rewritten=True)
+    return row_count
+
+# Function to empty the journal once its changes are in the CSV file
+def clear_journal():
+    global journal_op_count
+    global journal_end_offset
+    with open(journal_file_name, mode='w', newline='') as journal_obj:
+        journal_obj.flush()
+        os.fsync(journal_obj.fileno())
+    journal_op_count = 0
+    journal_end_offset = 0
+
+# Function to check whether the binary snapshot should be loaded instead of the CSV file
+# The snapshot is used when it is at least as new as the CSV file and the journal
+# still contains everything the snapshot was built from.
+def snapshot_is_fresher():
+    try:
+        snapshot_stat = os.stat(snapshot_file_name)
+    except FileNotFoundError:
+        return False
+    try:
+        if os.stat(file_name).st_mtime > snapshot_stat.st_mtime:
+            return False
+    except FileNotFoundError:
+        pass
+
+    # The journal must not have been cleared since the snapshot was written
+    with open(snapshot_file_name, mode='rb') as snapshot_obj:
+        header = snapshot_obj.read(snapshot_header.size)
+    if len(header) < snapshot_header.size:
+        return False
+    magic, version, rows, journal_offset = snapshot_header.unpack(header)
+    if magic != snapshot_magic or version != snapshot_version:
+        return False
+    try:
+        journal_size = os.path.getsize(journal_file_name)
+    except FileNotFoundError:
+        journal_size = 0
+    return journal_size >= journal_offset
+
+# Function to write the in-memory records to the binary snapshot file
+# Layout: header, then each column as (typecode, item size, byte length, raw bytes),
+# then each lookup table as (value count, byte length, NUL-separated UTF-8 text).
+# 'journal_offset' records how much of the journal the records already include.
+def write_snapshot(journal_offset):
+    compact_records()
+    temp_file_name = snapshot_file_name + '.tmp'
+    with open(temp_file_name, mode='wb') as snapshot_obj:
+        snapshot_obj.write(snapshot_header.pack(snapshot_magic, snapshot_version,
+                                                len(order_id), journal_offset))
+        for column in order_columns:
+            if sys.byteorder == 'big':
+                column = array(column.typecode, column)
+                column.byteswap()
+            data = column.tobytes()
+            snapshot_obj.write(struct.pack('<cBQ', column.typecode.encode(), column.itemsize, len(data)))
+            snapshot_obj.write(data)
+        for table in (customer_name_table, item_purchased_table, order_status_table):
+            data = "\0".join(table).encode()
+            snapshot_obj.write(struct.pack('<QQ', len(table), len(data)))
+            snapshot_obj.write(data)
+        snapshot_obj.flush()
+        os.fsync(snapshot_obj.fileno())
+    os.replace(temp_file_name, snapshot_file_name)
+
+# Function to read the binary snapshot file into the parallel arrays
+# The file is memory-mapped and each column is copied straight into its array.
+# Returns the row count and the journal offset stored in the snapshot.
+def read_snapshot():
+    with open(snapshot_file_name, mode='rb') as snapshot_obj, \
+            mmap.mmap(snapshot_obj.fileno(), 0, access=mmap.ACCESS_READ) as snapshot_map:
+        snapshot_view = memoryview(snapshot_map)
+        count_stat('bytes_read', len(snapshot_map))
+        try:
+            magic, version, rows, journal_offset = snapshot_header.unpack_from(snapshot_map, 0)
+            if magic != snapshot_magic or version != snapshot_version:
+                raise ValueError(f"'{snapshot_file_name}' is not a version {snapshot_version} snapshot")
+            offset = snapshot_header.size
+
+            for column in order_columns:
+                typecode, itemsize, length = struct.unpack_from('<cBQ', snapshot_map, offset)
+                offset += struct.calcsize('<cBQ')
+                if typecode.decode() != column.typecode or itemsize != column.itemsize:
+                    raise ValueError(f"'{snapshot_file_name}' was written with a different column layout")
+                column.frombytes(snapshot_view[offset:offset + length])
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                offset += length
+
+            for table, codes, lower_codes in ((customer_name_table, customer_name_codes, customer_name_lower),
+                                              (item_purchased_table, item_purchased_codes, item_purchased_lower),
+                                              (order_status_table, order_status_codes, order_status_lower)):
+                count, length = struct.unpack_from('<QQ', snapshot_map, offset)
+                offset += struct.calcsize('<QQ')
+                if count:
+                    table.extend(bytes(snapshot_view[offset:offset + length]).decode().split("\0"))
+                codes.update((value, code) for code, value in enumerate(table))
+                for code, value in enumerate(table):
+                    lower_codes.setdefault(value.lower(), []).append(code)
+                offset += length
+        finally:
+            snapshot_view.release()
+
+    if len(order_id) != rows:
+        raise ValueError(f"'{snapshot_file_name}' is incomplete")
+    rebuild_index()
+    return rows, journal_offset
+
+# Function to read the header row of an order file (csv_header if it has none)
+def read_file_header(path):
+    try:
+        with open_order_file(path) as csv_file_obj:
+            return next(csv.reader(csv_file_obj), None) or csv_header
+    except FileNotFoundError:
+        return csv_header
+
+# Function to write all records (including saved changes) to a fresh CSV file
+# Used when importing a snapshot; writes a temporary file and replaces the CSV file in one step.
+def write_csv_file():
+    compact_records()
+
+    # Keep the header of the existing file
+    header = read_file_header(file_name)
+
+    temp_file_name = file_name + '.tmp'
+    with open_order_file(temp_file_name, 'w', file_compression(file_name)) as temp_file_obj:
+        csv_writer = csv.writer(temp_file_obj)
+        csv_writer.writerow(header)
+        for i in range(len(order_id)):
+            csv_writer.writerow(get_row(i))
+    sync_file(temp_file_name)
+    os.replace(temp_file_name, file_name)
+    clear_journal()
+    stamp_storage_change(rewritten=True)
+
+# Function to open the SQLite database, creating the orders table and its indexes if needed
+# Dates are stored as day ordinals so the date index sorts them in date order.
+def open_database():
+    global database_connection
+    if database_connection is None:
+        database_connection = sqlite3.connect(database_file_name)
+        database_connection.execute("PRAGMA journal_mode=WAL")  # Readers do not block a save
+        database_connection.executescript("""
+            CREATE TABLE IF NOT EXISTS orders (
+                order_id INTEGER PRIMARY KEY,
+                customer_name TEXT NOT NULL,
+                item_purchased TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                order_date INTEGER NOT NULL,
+                total_price REAL NOT NULL,
+                order_status TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer_name);
+            CREATE INDEX IF NOT EXISTS orders_status ON orders (order_status);
+            CREATE INDEX IF NOT EXISTS orders_date ON orders (order_date);
+        """)
+        # Text filters match regardless of case the same way as in memory (SQLite's own
+        # LOWER() only knows ASCII letters)
+        database_connection.create_function("py_lower", 1, str.lower, deterministic=True)
+    return database_connection
+
+# Function to convert a database row into plain values (same layout as a CSV row)
+def database_row(row):
+    return row[:4] + (format_date(row[4]),) + row[5:]
+
+# Function to read the orders from the database into the parallel arrays
+# Rows are fetched in batches of load_chunk_size in Order ID order; in window mode
+# only the most recent orders are fetched. Returns the number of rows loaded.
+def read_database():
+    query = f"SELECT {database_columns} FROM orders"
+    parameters = ()
+    if load_window_size:
+        query += (" WHERE order_id >= IFNULL((SELECT order_id FROM orders"
+                  " ORDER BY order_id DESC LIMIT 1 OFFSET ?), ?)")
+        parameters = (load_window_size - 1, lowest_order_id)
+    cursor = open_database().execute(query + " ORDER BY order_id", parameters)
+
+    while True:
+        rows = cursor.fetchmany(load_chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            order_id.append(row[0])
+            customer_name.append(encode_value(customer_name_table, customer_name_codes, row[1], customer_name_lower))
+            item_purchased.append(encode_value(item_purchased_table, item_purchased_codes, row[2], item_purchased_lower))
+            quantity.append(row[3])
+            order_date.append(row[4])
+            total_price.append(row[5])
+            order_status.append(encode_value(order_status_table, order_status_codes, row[6], order_status_lower))
+
+    rebuild_index()
+    return len(order_id)
+
+# Function to store the pending changes in the database as one transaction
+# Either every change is stored or, if anything fails, none of them.
+def write_database_changes():
+    connection = open_database()
+    with connection:
+        for change in pending_changes:
+            if change[0] == 'A':
+                connection.execute(f"INSERT OR REPLACE INTO orders ({database_columns}) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (*change[1:5], parse_date(change[5]), *change[6:]))
+            elif change[0] == 'D':
+                connection.execute("DELETE FROM orders WHERE order_id = ?", (change[1],))
+            else:
+                connection.execute("UPDATE orders SET order_status = ? WHERE order_id = ?",
+                                   (change[2], change[1]))
+    count_stat('rows', len(pending_changes))
+    pending_changes.clear()
+
+# Function to replace every order in the database with the in-memory records
+# Used when converting the CSV file into the database; runs as one transaction.
+def write_database():
+    compact_records()
+    connection = open_database()
+    with connection:
+        connection.execute("DELETE FROM orders")
+        connection.executemany(
+            f"INSERT INTO orders ({database_columns}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((order_id[i], customer_name_table[customer_name[i]], item_purchased_table[item_purchased[i]],
+              quantity[i], order_date[i], total_price[i], order_status_table[order_status[i]])
+             for i in range(len(order_id))))
+
+# Function to get the highest Order ID in the database (first_order_id - 1 if it is empty)
+def database_last_order_id():
+    last_id = open_database().execute("SELECT MAX(order_id) FROM orders").fetchone()[0]
+    return first_order_id - 1 if last_id is None else last_id
+
+# Function to fetch one order from the database as plain values (None if not found)
+def fetch_database_order(find_order_id):
+    row = open_database().execute(f"SELECT {database_columns} FROM orders WHERE order_id = ?",
+                                  (find_order_id,)).fetchone()
+    return None if row is None else database_row(row)
+
+# Function to find which of the given Order IDs are in the database
+# The IDs are looked up in groups so each query stays within SQLite's parameter limit.
+def database_existing_ids(find_order_ids):
+    found = set()
+    find_order_ids = list(find_order_ids)
+    for start in range(0, len(find_order_ids), 500):
+        group = find_order_ids[start:start + 500]
+        found.update(row[0] for row in open_database().execute(
+            f"SELECT order_id FROM orders WHERE order_id IN ({', '.join('?' * len(group))})", group))
+    return found
+
+# Function to count the orders in the database
+def database_order_count():
+    return open_database().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+# Function to query the database with the same filters as query_records
+# Dates are DD/MM/YYYY strings and the range is inclusive. Returns the matching rows
+# (plain values) in Order ID order.
+def database_query(customer=None, item=None, status=None, date_from=None, date_to=None):
+    conditions = []
+    parameters = []
+    for column, value in (('customer_name', customer), ('item_purchased', item), ('order_status', status)):
+        if value:
+            conditions.append(f"py_lower({column}) = ?")
+            parameters.append(value.strip().lower())
+    if date_from:
+        conditions.append("order_date >= ?")
+        parameters.append(parse_date(date_from))
+    if date_to:
+        conditions.append("order_date <= ?")
+        parameters.append(parse_date(date_to))
+
+    query = f"SELECT {database_columns} FROM orders"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return [database_row(row) for row in open_database().execute(query + " ORDER BY order_id", parameters)]
+
+# Function to compute order totals per group with one GROUP BY query on the database
+# Returns the same list as stream_totals(), days in date order.
+def database_totals(group_by):
+    column = {'customer': 'customer_name', 'item': 'item_purchased',
+              'day': 'order_date', 'status': 'order_status'}[group_by]
+    rows = open_database().execute(f"SELECT {column}, COUNT(*), SUM(quantity), SUM(total_price) "
+                                   f"FROM orders GROUP BY {column} ORDER BY {column}").fetchall()
+    if group_by == 'day':
+        return [(format_date(day), count, qty, revenue) for day, count, qty, revenue in rows]
+    return rows
+
+# Function to find the position of an Order ID in the database (None if not found)
+def database_position(find_order_id):
+    if fetch_database_order(find_order_id) is None:
+        return None
+    return open_database().execute("SELECT COUNT(*) FROM orders WHERE order_id < ?",
+                                   (find_order_id,)).fetchone()[0]
+
+# Function to fetch one page of orders from the database as plain values
+# Pages are found by Order ID instead of OFFSET, so a page costs the same wherever it
+# is in the table: 'direction' 1 gives the page after 'boundary_id' and -1 the page before it.
+def fetch_database_page(boundary_id, page_size, direction=1):
+    if direction > 0:
+        rows = open_database().execute(
+            f"SELECT {database_columns} FROM orders WHERE order_id > ? ORDER BY order_id LIMIT ?",
+            (boundary_id, page_size)).fetchall()
+    else:
+        rows = open_database().execute(
+            f"SELECT {database_columns} FROM orders WHERE order_id < ? ORDER BY order_id DESC LIMIT ?",
+            (boundary_id, page_size)).fetchall()[::-1]
+    return [database_row(row) for row in rows]
+
+# Function to build a page renderer that reads the rows from the database
+# Moving one page forward or back continues from the Order IDs of the page on screen;
+# any other page first looks up the Order ID just before it.
+def database_page_renderer(total, page_size):
+    current = {'start': None, 'rows': []}
+
+    def render(start):
+        rows = current['rows']
+        if rows and start == current['start'] + page_size:
+            rows = fetch_database_page(rows[-1][0], page_size, 1)
+        elif rows and start == current['start'] - page_size:
+            rows = fetch_database_page(rows[0][0], page_size, -1)
+        elif not (rows and start == current['start']):
+            boundary = lowest_order_id
+            if start > 0:
+                boundary = open_database().execute("SELECT order_id FROM orders ORDER BY order_id "
+                                                   "LIMIT 1 OFFSET ?", (start - 1,)).fetchone()[0]
+            rows = fetch_database_page(boundary, page_size, 1)
+        current['start'] = start
+        current['rows'] = rows
+        return format_page(rows, start, total, page_size)
+
+    return render
+
+# Function to check whether records should be read straight from the database
+# (SQLite backend with nothing loaded into memory)
+def use_database_view():
+    return storage_backend == 'sqlite' and not records_loaded
+
+# Function to check whether queries and reports should read the stored orders directly
+# (nothing loaded or added in memory, and the CSV file, database or partition manifest exists)
+def use_file_view():
+    if records_loaded or order_index:
+        return False
+    if storage_backend == 'sqlite':
+        return os.path.exists(database_file_name)
+    if storage_backend == 'partitions':
+        return os.path.exists(os.path.join(partition_folder, manifest_file_name))
+    return os.path.exists(file_name)
+
+# Function to get the name of the stored orders of the current backend for messages
+def storage_name():
+    return {'sqlite': database_file_name, 'partitions': partition_folder}.get(storage_backend, file_name)
+
+# Function to get the partition month ('YYYY-MM') of an order date given as a day ordinal
+def partition_month(day):
+    month_date = datetime.date.fromordinal(day)
+    return f"{month_date.year:04d}-{month_date.month:02d}"
+
+# Function to get the file path of a partition
+def partition_path(month):
+    return os.path.join(partition_folder, f"orders_{month}.csv")
+
+# Function to read the partition manifest
+# Returns a dictionary of month -> partition entry (empty if there is no manifest yet).
+def read_manifest():
+    try:
+        with open(os.path.join(partition_folder, manifest_file_name)) as manifest_obj:
+            manifest = json.load(manifest_obj)
+    except FileNotFoundError:
+        return {}
+    if manifest.get("version") != manifest_version:
+        raise ValueError(f"'{manifest_file_name}' is not a version {manifest_version} manifest")
+    return manifest["partitions"]
+
+# Function to write the partition manifest (through a temporary file, replaced in one step)
+def write_manifest(partitions):
+    os.makedirs(partition_folder, exist_ok=True)
+    manifest_path = os.path.join(partition_folder, manifest_file_name)
+    with open(manifest_path + '.tmp', mode='w') as manifest_obj:
+        json.dump({"version": manifest_version, "partitions": dict(sorted(partitions.items()))},
+                  manifest_obj, indent=1)
+    sync_file(manifest_path + '.tmp')
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+# Function to create an empty manifest entry for a partition
+def new_partition_entry(month):
+    return {"file": os.path.basename(partition_path(month)),
+            "first_id": None, "last_id": None, "rows": 0, "status_counts": {}}
+
+# Function to count one row (plain values) in the manifest entry of its partition
+def count_partition_row(entry, row):
+    if entry["rows"]:
+        entry["first_id"] = min(entry["first_id"], row[0])
+        entry["last_id"] = max(entry["last_id"], row[0])
+    else:
+        entry["first_id"] = entry["last_id"] = row[0]
+    entry["rows"] += 1
+    entry["status_counts"][row[6]] = entry["status_counts"].get(row[6], 0) + 1
+
+# Function to split the CSV file (with its journal) into monthly partitions
+# Streams the CSV file once and writes each partition through a temporary file.
+# Returns the number of records and partitions written.
+def split_into_partitions():
+    if read_journal()[0]:
+        compact_storage()
+    header = read_file_header(file_name)
+    old_partitions = read_manifest()
+    os.makedirs(partition_folder, exist_ok=True)
+
+    partitions = {}
+    writers = {}  # month -> (temporary file object, csv writer)
+    rejects = []
+    try:
+        for chunk in stream_records(rejects=rejects):
+            for row in chunk:
+                month = partition_month(parse_date(row[4]))
+                if month not in writers:
+                    temp_file_obj = open(partition_path(month) + '.tmp', mode='w', newline='')
+                    writers[month] = (temp_file_obj, csv.writer(temp_file_obj))
+                    writers[month][1].writerow(csv_header if header_positions(header) else header)
+                    partitions[month] = new_partition_entry(month)
+                writers[month][1].writerow(row)
+                count_partition_row(partitions[month], row)
+    finally:
+        for temp_file_obj, csv_writer in writers.values():
+            temp_file_obj.close()
+
+    for month in partitions:
+        sync_file(partition_path(month) + '.tmp')
+        os.replace(partition_path(month) + '.tmp', partition_path(month))
+    # Months that no longer have any orders lose their old partition file
+    for month in old_partitions.keys() - partitions.keys():
+        if os.path.exists(partition_path(month)):
+            os.remove(partition_path(month))
+    write_manifest(partitions)
+    stamp_storage_change(rewritten=True)
+    # Rows that are not valid orders stay behind in the rejects file of the CSV file
+    quarantine_rows(file_name, rejects, header)
+    return sum(entry["rows"] for entry in partitions.values()), len(partitions)
+
+# Function to rebuild the manifest by reading every partition file
+# Used by compaction, for example after a partition file was edited by hand.
+# Returns the number of records and partitions found.
+def rebuild_manifest():
+    partitions = {}
+    for entry_name in sorted(os.listdir(partition_folder)):
+        if not (entry_name.startswith("orders_") and entry_name.endswith(".csv")):
+            continue
+        month = entry_name[len("orders_"):-len(".csv")]
+        entry = new_partition_entry(month)
+        with open(partition_path(month), newline='') as partition_obj:
+            csv_reader = csv.reader(partition_obj)
+            positions = header_positions(next(csv_reader, None))
+            for chunk in iter_record_chunks(csv_reader, load_chunk_size, [], positions):
+                for row in chunk:
+                    count_partition_row(entry, row)
+        if entry["rows"]:
+            partitions[month] = entry
+    write_manifest(partitions)
+    return sum(entry["rows"] for entry in partitions.values()), len(partitions)
+
+# Function to pick the partitions that can hold orders matching a query
+# Dates are DD/MM/YYYY strings (None = open end); the manifest status counts skip
+# partitions without any order of 'status'. Returns the months in Order ID order.
+def select_partitions(date_from=None, date_to=None, status=None):
+    first_month = partition_month(parse_date(date_from)) if date_from else None
+    last_month = partition_month(parse_date(date_to)) if date_to else None
+    partitions = read_manifest()
+    months = []
+    for month, entry in partitions.items():
+        if first_month and month < first_month or last_month and month > last_month:
+            continue
+        if status and not any(count for value, count in entry["status_counts"].items()
+                              if value.lower() == status.strip().lower()):
+            continue
+        months.append(month)
+    return sorted(months, key=lambda month: partitions[month]["first_id"])
+
+# Function to read partitions into the parallel arrays
+# Rows that are not valid orders are quarantined in each partition's rejects file.
+# Returns the number of rows read.
+def read_partitions(months):
+    row_count = 0
+    for month in months:
+        count_stat('bytes_read', os.path.getsize(partition_path(month)))
+        rejects = []
+        with open(partition_path(month), newline='') as partition_obj:
+            csv_reader = csv.reader(partition_obj)
+            header = next(csv_reader, None)
+            positions = header_positions(header)
+            for chunk in iter_record_chunks(csv_reader, load_chunk_size, rejects, positions):
+                for row in chunk:
+                    append_row(*row)
+                row_count += len(chunk)
+        quarantine_rows(partition_path(month), rejects, header)
+    sort_by_order_id()
+    return row_count
+
+# Function to stream order records from partition files without loading them
+# Yields batches of row tuples (see iter_record_chunks), partition by partition;
+# rows that are not valid orders are skipped.
+def stream_partitions(months, chunk_size=None):
+    chunk_size = chunk_size or load_chunk_size
+    for month in months:
+        with open(partition_path(month), newline='') as partition_obj:
+            csv_reader = csv.reader(partition_obj)
+            positions = header_positions(next(csv_reader, None))
+            yield from iter_record_chunks(csv_reader, chunk_size, [], positions)
+
+# Function to put the rows in Order ID order
+# Partitions are read month by month, and an order can be dated in an earlier month
+# than orders added before it, so the rows are sorted once if they are out of order.
+def sort_by_order_id():
+    compact_records()
+    if all(order_id[i] < order_id[i + 1] for i in range(len(order_id) - 1)):
+        return
+    positions = sorted(range(len(order_id)), key=order_id.__getitem__)
+    for column in order_columns:
+        column[:] = array(column.typecode, [column[i] for i in positions])
+    rebuild_index()
+
+# Function to find which of the given Order IDs are stored in partitions that are not loaded
+# Only partitions whose Order ID range covers one of the IDs are read.
+def partition_existing_ids(find_order_ids):
+    find_order_ids = set(find_order_ids)
+    wanted = sorted(find_order_ids)
+    found = set()
+    for month, entry in read_manifest().items():
+        if records_loaded and (loaded_partitions is None or month in loaded_partitions):
+            continue
+        position = bisect.bisect_left(wanted, entry["first_id"])
+        if position == len(wanted) or wanted[position] > entry["last_id"]:
+            continue
+        with open(partition_path(month), newline='') as partition_obj:
+            csv_reader = csv.reader(partition_obj)
+            next(csv_reader, None)  # Skip the header
+            for row in csv_reader:
+                if row and int(row[0]) in find_order_ids:
+                    found.add(int(row[0]))
+    return found
+
+# Function to write the pending changes into the partitions they touch
+# Partitions with only new orders are appended to; any other changed partition is
+# streamed into a temporary file with the changes applied and replaced in one step.
+# The manifest is written last. Returns the number of partitions written.
+def write_partition_changes():
+    partitions = read_manifest()
+
+    # Find the partition of every change: new rows by their order date, loaded rows by
+    # their date in memory, other rows by the Order ID ranges in the manifest
+    changes_by_month = {}
+    for change_id, change in fold_changes(pending_ops()).items():
+        index = find_row(change_id)
+        if isinstance(change, tuple):
+            months = [partition_month(parse_date(change[4]))]
+        elif index is not None:
+            months = [partition_month(order_date[index])]
+        else:
+            months = [month for month, entry in partitions.items()
+                      if entry["first_id"] <= change_id <= entry["last_id"]]
+        for month in months:
+            changes_by_month.setdefault(month, {})[change_id] = change
+
+    os.makedirs(partition_folder, exist_ok=True)
+    for month, changes in changes_by_month.items():
+        path = partition_path(month)
+        if not os.path.exists(path):
+            # Nothing is stored for this month yet, so only its new orders are written
+            changes = {change_id: change for change_id, change in changes.items() if isinstance(change, tuple)}
+            if not changes:
+                continue
+
+        # New Order IDs are never in a partition yet, so new orders can be appended
+        if all(isinstance(change, tuple) for change in changes.values()):
+            entry = partitions.setdefault(month, new_partition_entry(month))
+            new_file = not os.path.exists(path)
+            start_size = 0 if new_file else os.path.getsize(path)
+            with open(path, mode='a', newline='') as partition_obj:
+                csv_writer = csv.writer(partition_obj)
+                if new_file:
+                    csv_writer.writerow(read_file_header(file_name))
+                for row in changes.values():
+                    csv_writer.writerow(row)
+                    count_partition_row(entry, row)
+            sync_file(path)
+            count_stat('bytes_written', os.path.getsize(path) - start_size)
+            continue
+
+        entry = new_partition_entry(month)
+        with open(path, newline='') as partition_obj, \
+                open(path + '.tmp', mode='w', newline='') as temp_file_obj:
+            csv_reader = csv.reader(partition_obj)
+            csv_writer = csv.writer(temp_file_obj)
+            header = next(csv_reader, None)
+            positions = header_positions(header)
+            csv_writer.writerow(csv_header if positions or not header else header)
+            rejects = []
+            for row in apply_changes(csv_reader, changes, rejects, positions):
+                csv_writer.writerow(row)
+                count_partition_row(entry, row)
+            for row in changes.values():
+                if isinstance(row, tuple):
+                    csv_writer.writerow(row)
+                    count_partition_row(entry, row)
+            # Rows that are not valid orders are kept as they are
+            for line_number, reason, row in rejects:
+                csv_writer.writerow(row)
+        count_stat('bytes_written', os.path.getsize(path + '.tmp'))
+
+        # A partition whose orders were all deleted is removed
+        if entry["rows"]:
+            sync_file(path + '.tmp')
+            os.replace(path + '.tmp', path)
+            partitions[month] = entry
+        else:
+            os.remove(path + '.tmp')
+            os.remove(path)
+            partitions.pop(month, None)
+
+    write_manifest(partitions)
+    count_stat('rows', len(pending_changes))
+    pending_changes.clear()
+    return len(changes_by_month)
+
+# Function to find which of the given Order IDs are stored but not in memory
+# (the SQLite database, or partitions that were not loaded)
+def stored_order_ids(find_order_ids):
+    if storage_backend == 'sqlite':
+        return database_existing_ids(find_order_ids)
+    if storage_backend == 'partitions':
+        return partition_existing_ids(find_order_ids)
+    return set()
+
+# Function to compact the storage files on request from the menu
+@storage_locked(exclusive=True)
+def compact_files():
+    if records_not_saved:
+        print("\nPlease save your changes before compacting the storage files.")
+        return
+    if storage_backend == 'sqlite':
+        try:
+            open_database().execute("VACUUM")
+            print(f"\nDatabase '{database_file_name}' compacted.")
+        except sqlite3.Error as e:
+            print(f"\nError compacting the database: {e}")
+        return
+    if storage_backend == 'partitions':
+        try:
+            row_count, partition_count = rebuild_manifest()
+            print(f"\nManifest rebuilt: {row_count} records in {partition_count} partitions.")
+        except FileNotFoundError:
+            print(f"\nThere is no '{partition_folder}' folder to compact.")
+        except Exception as e:
+            print(f"\nError rebuilding the manifest: {e}")
+        return
+    try:
+        row_count = compact_storage()
+        print(f"\nStorage compacted: {row_count} records written to '{file_name}' and the journal cleared.")
+    except FileNotFoundError:
+        print(f"\nThere is no '{file_name}' file to compact.")
+    except Exception as e:
+        print(f"\nError compacting storage: {e}")
+
+# Function to convert between the CSV file and the snapshot, database or partitions
+def convert_files():
+    if records_not_saved:
+        print("\nPlease save your changes before converting the storage files.")
+        return
+    if load_window_size:
+        print("\nConverting needs every record in memory. Set load_window_size to 0 first.")
+        return
+
+    print("\n1. Export CSV to snapshot")
+    print("2. Import snapshot to CSV")
+    print("3. Export CSV to SQLite database")
+    print("4. Import SQLite database to CSV")
+    print("5. Split CSV into monthly partitions")
+    print("6. Merge monthly partitions into CSV")
+    choice = input("Enter the number corresponding to the conversion: ").strip()
+    run_conversion(choice)
+
+# Function to run one conversion from the convert menu
+# The order files stay locked for the whole conversion, so no other session saves
+# between reading the source and writing the target.
+@storage_locked(exclusive=True)
+def run_conversion(choice):
+    try:
+        if choice == "1":
+            load_records('csv')
+            if records_loaded:
+                write_snapshot(journal_end_offset)
+                print(f"\n{len(order_id)} records exported to '{snapshot_file_name}'.")
+        elif choice == "2":
+            load_records('snapshot')
+            if records_loaded:
+                write_csv_file()
+                print(f"\n{len(order_id)} records imported into '{file_name}'.")
+        elif choice == "3":
+            load_records('csv')
+            if records_loaded:
+                write_database()
+                print(f"\n{len(order_id)} records exported to '{database_file_name}'.")
+        elif choice == "4":
+            load_records('database')
+            if records_loaded:
+                write_csv_file()
+                print(f"\n{len(order_id)} records imported into '{file_name}'.")
+        elif choice == "5":
+            row_count, partition_count = split_into_partitions()
+            print(f"\n{row_count} records split into {partition_count} partitions in '{partition_folder}'.")
+        elif choice == "6":
+            load_records('partitions')
+            if records_loaded:
+                write_csv_file()
+                print(f"\n{len(order_id)} records merged into '{file_name}'.")
+        else:
+            print("Invalid choice. Returning to main menu.")
+    except Exception as e:
+        print(f"\nError converting files: {e}")
+
+# Function to check whether the CSV file should be parsed by worker processes
+# Window mode keeps the serial loader so that memory stays bounded.
+# (Compressed files cannot be split into byte ranges, so they are always parsed here.)
+def use_parallel_parsing():
+    if parse_workers <= 1 or load_window_size or file_compression(file_name):
+        return False
+    try:
+        return os.path.getsize(file_name) >= parallel_min_bytes
+    except OSError:
+        return False
+
+# Function to split the data rows of the CSV file into byte ranges
+# Each range starts at the beginning of a line and ends just after a line break,
+# so every row falls into exactly one range. This relies on each row being on a
+# single line, which is true for files written by this application.
+# 'file_size' stops the ranges at that byte offset (default: the end of the file).
+def split_byte_ranges(range_count, file_size=None):
+    with open(file_name, mode='rb') as csv_file_obj:
+        csv_file_obj.readline()  # Skip the header
+        data_start = csv_file_obj.tell()
+        if file_size is None:
+            file_size = csv_file_obj.seek(0, os.SEEK_END)
+
+        boundaries = [data_start]
+        step = max(1, (file_size - data_start) // range_count)
+        for part in range(1, range_count):
+            position = data_start + part * step
+            if position <= boundaries[-1]:
+                continue
+            # Move forward to the start of the next line
+            csv_file_obj.seek(position)
+            csv_file_obj.readline()
+            position = csv_file_obj.tell()
+            if position >= file_size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+        boundaries.append(file_size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)
+            if boundaries[i + 1] > boundaries[i]]
+
+# Function run by a worker process to parse one byte range of a CSV file
+# The text columns are dictionary-encoded against tables local to this range;
+# the main process maps them onto the global tables when merging. Rows that are
+# not valid orders are returned with their line numbers inside the range.
+# Returns a dictionary of column bytes, local lookup tables, rejects and ID order details.
+def parse_byte_range(csv_file_name, start, end, positions=None):
+    with open(csv_file_name, mode='rb') as csv_file_obj:
+        csv_file_obj.seek(start)
+        data = csv_file_obj.read(end - start)
+
+    ids = array('q')
+    names = array('I')
+    items = array('I')
+    quantities = array('q')
+    days = array('i')
+    prices = array('d')
+    statuses = array('H')
+    tables = ([], [], [])
+    codes = ({}, {}, {})
+    ordered = True
+    rejects = []
+
+    for chunk in iter_record_chunks(csv.reader(io.StringIO(data.decode(), newline='')),
+                                    load_chunk_size, rejects, positions):
+        for row_order_id, name, item, qty, date, price, status in chunk:
+            if ids and row_order_id <= ids[-1]:
+                ordered = False
+            ids.append(row_order_id)
+            names.append(encode_value(tables[0], codes[0], name))
+            items.append(encode_value(tables[1], codes[1], item))
+            quantities.append(qty)
+            days.append(parse_date(date))
+            prices.append(price)
+            statuses.append(encode_value(tables[2], codes[2], status))
+
+    return {
+        'columns': [column.tobytes() for column in (ids, names, items, quantities, days, prices, statuses)],
+        'tables': tables,
+        'rejects': rejects,
+        'lines': data.count(b'\n'),
+        'ordered': ordered,
+        'first_id': ids[0] if ids else None,
+        'last_id': ids[-1] if ids else None
+    }
+
+# Function to load the CSV file by parsing byte ranges in a pool of worker processes
+# The parsed ranges are merged into the parallel arrays in file order, and the
+# Order IDs are checked to be in ascending order. Rows that are not valid orders
+# are added to 'rejects' with their line numbers in the file (see iter_record_chunks).
+# Returns the number of rows loaded and the number of lines read.
+def parallel_load(file_size=None, rejects=None, positions=None):
+    ranges = split_byte_ranges(parse_workers * 4, file_size)
+    out_of_order = 0
+    last_id = None
+    line_count = 1  # The header
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        results = executor.map(parse_byte_range, [file_name] * len(ranges),
+                               [start for start, end in ranges], [end for start, end in ranges],
+                               [positions] * len(ranges))
+        for result in results:
+            # Workers count their parse errors in their own process, so count them here
+            for line_number, reason, row in result['rejects']:
+                count_stat('parse_errors')
+                if rejects is not None:
+                    rejects.append((line_count + line_number, reason, row))
+            line_count += result['lines']
+            if result['first_id'] is None:
+                continue
+
+            # Check the ID order inside the range and across the range boundary
+            if not result['ordered']:
+                out_of_order += 1
+            if last_id is not None and result['first_id'] <= last_id:
+                out_of_order += 1
+            last_id = result['last_id']
+
+            # Map the range's local codes onto the global lookup tables
+            code_maps = []
+            for local_table, table, codes, lower_codes in zip(
+                    result['tables'],
+                    (customer_name_table, item_purchased_table, order_status_table),
+                    (customer_name_codes, item_purchased_codes, order_status_codes),
+                    (customer_name_lower, item_purchased_lower, order_status_lower)):
+                code_maps.append([encode_value(table, codes, value, lower_codes) for value in local_table])
+
+            for column, data in zip(order_columns, result['columns']):
+                column.frombytes(data)
+            start = len(order_id) - len(result['columns'][0]) // order_id.itemsize
+            for column, code_map in ((customer_name, code_maps[0]),
+                                     (item_purchased, code_maps[1]),
+                                     (order_status, code_maps[2])):
+                # Codes only need changing when the global table order differs
+                if code_map != list(range(len(code_map))):
+                    column[start:] = array(column.typecode, [code_map[code] for code in column[start:]])
+
+    rebuild_index()
+    if out_of_order:
+        print(f"\nWARNING: Order IDs are not in ascending order in {out_of_order} places.")
+    if len(order_index) != len(order_id):
+        print(f"WARNING: {len(order_id) - len(order_index)} duplicate Order IDs found.")
+    return len(order_id), line_count
+
+# Function to finish a load once the rows from the CSV file, snapshot or database are in memory
+# Replays the journal (not used by the database, 'journal_offset' None), applies
+# window mode and reports the result.
+def finish_load(row_count, journal_offset, source_name):
+    global records_loaded
+
+    # Apply the changes saved to the journal since the last compaction or snapshot
+    journal_count = 0 if journal_offset is None else replay_journal(journal_offset)
+
+    if load_window_size:
+        trim_to_window(load_window_size)
+        mode_text = f"window of the most recent {load_window_size}"
+    else:
+        mode_text = "full"
+
+    build_secondary_indexes()
+    count_stat('rows', row_count + journal_count)
+
+    # Check if at least one record found
+    if row_count > 0 or order_index:
+        print("\n" + str(row_count) + f" records successfully loaded from '{source_name}'.")
+        if journal_count:
+            print(f"{journal_count} saved changes replayed from '{journal_file_name}'.")
+        if load_window_size:
+            print(f"{len(order_id)} most recent records kept in memory.")
+        print(f"Load mode: {mode_text}, peak memory: {peak_memory_text()}")
+        records_loaded = True
+    else:
+        print("\nThe file has no data rows after the header.")
+
+# Function to read the lines of an open binary file as text, stopping at byte 'end'
+def read_text_lines(file_obj, end):
+    position = file_obj.tell()
+    for line in file_obj:
+        position += len(line)
+        if position >= end:
+            yield line[:len(line) - (position - end)].decode()
+            return
+        yield line.decode()
+
+# Function to describe the current end of the CSV file for an incremental refresh
+# With 'whole_lines' the offset stops after the last line break, so a row that
+# another process is still writing is left for the next refresh.
+def csv_file_state(csv_file_obj, whole_lines=False):
+    file_stat = os.fstat(csv_file_obj.fileno())
+    offset = file_stat.st_size
+    if whole_lines:
+        # Step back to the last line break
+        while offset > 0:
+            step = min(tail_read_size, offset)
+            csv_file_obj.seek(offset - step)
+            newline = csv_file_obj.read(step).rfind(b"\n")
+            if newline >= 0:
+                offset = offset - step + newline + 1
+                break
+            offset -= step
+    start = csv_file_obj.tell()
+    state = {'device': file_stat.st_dev, 'inode': file_stat.st_ino, 'size': file_stat.st_size,
+             'mtime': file_stat.st_mtime_ns, 'offset': offset,
+             'fingerprint': file_fingerprint(csv_file_obj, offset), 'rows': 0}
+    csv_file_obj.seek(start)
+    return state
+
+# Function to read the bytes just before 'offset', used to spot a rewritten file
+def file_fingerprint(file_obj, offset):
+    file_obj.seek(max(0, offset - fingerprint_size))
+    return file_obj.read(min(offset, fingerprint_size))
+
+# Function to refresh the loaded records with the changes made by other sessions
+# Reads only the rows appended to the CSV file and the journal batches committed
+# since the last load or refresh. A full load is done instead when the CSV file was
+# replaced (for example by a compaction), truncated or rewritten, or when the
+# records did not come from the CSV file. Unsaved changes in memory are kept.
+@instrumented
+def refresh_records(confirm=True):
+    if not refresh_from_files():
+        load_records(confirm=confirm)
+
+# Function to read the rows and journal changes saved since the last load or refresh
+# Other sessions cannot save meanwhile. Unsaved changes of this session are applied
+# again on top. Returns False (after printing the reason) if a full load is needed.
+@storage_locked(exclusive=False)
+def refresh_from_files():
+    global loaded_file_state
+    global journal_op_count
+    global journal_end_offset
+    global loaded_version
+
+    stamp = read_version_stamp()
+    state = loaded_file_state
+    reason = None
+    if storage_backend != 'csv':
+        reason = f"the {storage_backend} backend is used"
+    elif file_compression(file_name):
+        reason = f"'{file_name}' is compressed"
+    elif not records_loaded or state is None:
+        reason = "the records were not loaded from the CSV file"
+
+    try:
+        if reason is None:
+            with open(file_name, mode='rb') as csv_file_obj:
+                new_state = csv_file_state(csv_file_obj, whole_lines=True)
+                if (new_state['device'], new_state['inode']) != (state['device'], state['inode']):
+                    reason = f"'{file_name}' was replaced"
+                elif new_state['size'] < state['offset']:
+                    reason = f"'{file_name}' was truncated"
+                elif file_fingerprint(csv_file_obj, state['offset']) != state['fingerprint']:
+                    reason = f"'{file_name}' was rewritten"
+                else:
+                    csv_file_obj.seek(state['offset'])
+                    data = csv_file_obj.read(max(0, new_state['offset'] - state['offset']))
+            if reason is None and os.path.exists(journal_file_name) \
+                    and os.path.getsize(journal_file_name) < journal_end_offset:
+                reason = f"'{journal_file_name}' was cleared"
+    except FileNotFoundError:
+        reason = f"'{file_name}' is missing"
+
+    if reason is not None:
+        print(f"\nFull load needed: {reason}.")
+        return False
+
+    # Apply the new rows like journal adds, so a row read twice is not duplicated
+    count_stat('bytes_read', len(data))
+    rejects = []
+    tail_reader = csv.reader(io.StringIO(data.decode(), newline=''))
+    rows = [row for chunk in iter_record_chunks(tail_reader, load_chunk_size, rejects, state['positions'])
+            for row in chunk]
+    rejects = [(state['lines'] + line_number, reason, row) for line_number, reason, row in rejects]
+    quarantine_rows(file_name, rejects, state['header'], append=True)
+    rebuild = indexes_ready and len(rows) >= load_chunk_size
+    if rebuild:
+        set_indexes_ready(False)  # Built in one pass at the end
+    for row in rows:
+        apply_journal_op(('A', row))
+
+    # Then the changes other sessions saved to the journal
+    ops, journal_end_offset = read_journal(journal_end_offset)
+    for op in ops:
+        apply_journal_op(op)
+    journal_op_count += len(ops)
+    if ops:
+        for op in pending_ops():
+            apply_journal_op(op)
+    loaded_version = stamp
+
+    if load_window_size:
+        trim_to_window(load_window_size)
+    if rebuild:
+        build_secondary_indexes()
+
+    if new_state['offset'] > state['offset']:
+        new_state['rows'] = state['rows'] + len(rows)
+        new_state['lines'] = state['lines'] + data.count(b'\n')
+        new_state['header'] = state['header']
+        new_state['positions'] = state['positions']
+        loaded_file_state = new_state
+    count_stat('rows', len(rows) + len(ops))
+    print(f"\n{len(rows)} new records read from '{file_name}' and {len(ops)} saved changes "
+          f"replayed from '{journal_file_name}'.")
+    return True
+
 # Function to load records
-# Reads order data from the OrderDetails.csv file and loads it into the parallel arrays.
-def load_records():
+# Reads order data from the OrderDetails.csv file (or the binary snapshot when it
+# is newer) and loads it into the parallel arrays.
+@instrumented
+def load_records(source=None, confirm=True, date_from=None, date_to=None, status=None):
     """
     Load order records from the CSV file into parallel arrays.
-    If records already exist in-memory, they will be cleared first.
+    The binary snapshot is used instead when it is at least as new as the CSV file,
+    the database when storage_backend is 'sqlite' and the monthly partitions when it
+    is 'partitions'; 'source' can force 'csv', 'snapshot', 'database' or 'partitions'.
+    For partitions, 'date_from', 'date_to' (DD/MM/YYYY) and 'status' load only the
+    partitions that can hold matching orders.
+    If records already exist in-memory, they will be cleared first (after asking
+    the user when there are unsaved changes, unless 'confirm' is False).
     Sets 'records_loaded' to True if successful.
     """
 
-    global records_loaded
-    global data_found
-
     # Check if there is unsaved data in memory before loading from the csv file
-    if records_not_saved:
+    if records_not_saved and confirm:
         while True:
             print("\nWARNING: You have unsaved records in memory.")
             confirm = input("Loading now will discard them. Do you want to proceed? (Y/N): ").strip().lower()
@@ -110,13 +2489,70 @@ def load_records():
                 return # Don't load records
             print("Invalid input. Please enter 'Y' for yes or 'N' for no.")
 
+    read_records(source, date_from, date_to, status)
+
+# Function to read the order files into the parallel arrays for load_records
+# Other sessions cannot save while the files are read, and the version stamp read
+# here is the one the loaded records are up to date with.
+@storage_locked(exclusive=False)
+def read_records(source, date_from, date_to, status):
+
+    global data_found
+    global loaded_file_state
+    global loaded_partitions
+    global loaded_version
+
     try:
+        loaded_file_state = None  # Set again once the CSV file is loaded
+        loaded_version = read_version_stamp()
+        loaded_partitions = None
+
+        # Pick the database or partitions, or whichever of the snapshot and the CSV file is fresher
+        if source is None and storage_backend == 'sqlite':
+            source = 'database'
+        elif source is None and storage_backend == 'partitions':
+            source = 'partitions'
+        elif source is None:
+            source = 'snapshot' if snapshot_is_fresher() else 'csv'
+
+        if source == 'database':
+            clear_array()
+            set_indexes_ready(False)  # Built in one pass once loading finishes
+            row_count = read_database()
+            finish_load(row_count, None, database_file_name)
+            return
+
+        if source == 'partitions':
+            clear_array()
+            set_indexes_ready(False)  # Built in one pass once loading finishes
+            months = select_partitions(date_from, date_to, status)
+            partition_count = len(read_manifest())
+            row_count = read_partitions(months)
+            finish_load(row_count, None, partition_folder)
+            if len(months) < partition_count:
+                loaded_partitions = set(months)
+                print(f"Partitions loaded: {len(months)} of {partition_count} ({', '.join(sorted(months)) or 'none'}).")
+            return
+
+        if source == 'snapshot':
+            clear_array()
+            set_indexes_ready(False)  # Built in one pass once loading finishes
+            row_count, journal_offset = read_snapshot()
+            finish_load(row_count, journal_offset, snapshot_file_name)
+            return
 
         # Open the csv file in to an object file
-        with open(file_name, mode='r', newline='') as csv_file_obj:
-
-            #Read the object file
-            csv_reader = csv.reader(csv_file_obj)
+        compressed = file_compression(file_name)
+        with (open_order_file(file_name) if compressed else open(file_name, mode='rb')) as csv_file_obj:
+
+            # Read the object file up to its current end (rows appended later are
+            # picked up by an incremental refresh); compressed files are read to the end
+            if compressed:
+                file_state = None
+                csv_reader = csv.reader(csv_file_obj)
+            else:
+                file_state = csv_file_state(csv_file_obj)
+                csv_reader = csv.reader(read_text_lines(csv_file_obj, file_state['offset']))
 
             # Skip the first row (header)
             header = next(csv_reader, None)
@@ -132,30 +2568,45 @@ def load_records():
 
                 # Clear in-memory data
                 clear_array()
+                set_indexes_ready(False)  # Built in one pass once loading finishes
+                count_stat('bytes_read', os.path.getsize(file_name))
 
                 row_count = 0  # Initialize row count
 
-                # loop through the rest of the rows and stores in the parallel arrays
-                for row in csv_reader:
-
-                    # Set flag if at least one row is found
-                    data_found = True
-
-                    order_id.append(int(row[0]))
-                    customer_name.append(row[1])
-                    item_purchased.append(row[2])
-                    quantity.append(int(row[3]))
-                    order_date.append(row[4])
-                    total_price.append(float(row[5]))
-                    order_status.append(row[6])
-                    row_count += 1  # Increment row count
-
-                # Check if at least one record found after the header
-                if data_found and row_count > 0:
-                    print("\n" + str(row_count) + " records successfully loaded from 'OrderDetails.csv'.")
-                    records_loaded = True
+                # Match the columns by their header names, and set aside rows that are not valid orders
+                positions = header_positions(header)
+                if not header_recognised(header):
+                    print(f"\nWARNING: The header of '{file_name}' does not name all seven columns; "
+                          f"the usual column order is assumed.")
+                rejects = []
+
+                # Large files can be parsed by several worker processes instead
+                if use_parallel_parsing():
+                    row_count, line_count = parallel_load(file_state['offset'], rejects, positions)
                 else:
-                    print("\nThe file has no data rows after the header.")
+                    # Read the rest of the rows in chunks and store them in the parallel arrays
+                    for chunk in iter_record_chunks(csv_reader, load_chunk_size, rejects, positions):
+
+                        # Set flag if at least one row is found
+                        data_found = True
+
+                        for row in chunk:
+                            append_row(*row)
+                        row_count += len(chunk)  # Increment row count
+
+                        # In window mode, drop the oldest orders once the arrays hold twice the window
+                        if load_window_size and len(order_id) >= 2 * load_window_size:
+                            trim_to_window(load_window_size)
+                    line_count = csv_reader.line_num
+
+                quarantine_rows(file_name, rejects, header)
+                finish_load(row_count, 0, file_name)
+                if records_loaded and file_state is not None:
+                    file_state['rows'] = row_count
+                    file_state['lines'] = line_count
+                    file_state['header'] = header
+                    file_state['positions'] = positions
+                    loaded_file_state = file_state
 
     except Exception as e:
         print(f"\nUnexpected error: {e}")
@@ -163,45 +2614,598 @@ def load_records():
         clear_array()
 
 
+# Function to format one row (plain values) as a line of the records table
+def format_row(row):
+    return (f"{row[0]:>8d}  "
+            f"{row[1][:24]:<25} "
+            f"{row[2][:24]:<25} "
+            f"{row[3]:>5d}  "
+            f"{row[4]:<12} "
+            f"{row[5]:>10.2f}  "
+            f"{row[6][:14]:<15}")
+
+# Function to build the text of one page of the records table
+# 'rows' is the list of row positions being shown (None = every row in table order).
+# Only the rows on the page are formatted, so the cost depends on the page size
+# and not on the number of records.
+def render_page(start, page_size, rows=None):
+    total = len(order_id) if rows is None else len(rows)
+    end = min(start + page_size, total)
+    return format_page([get_row(i if rows is None else rows[i]) for i in range(start, end)],
+                       start, total, page_size)
+
+# Function to build the text of one page from its rows (plain values)
+# 'start' is the position of the first row and 'total' the number of rows in the view.
+def format_page(page_rows, start, total, page_size):
+    end = start + len(page_rows)
+    lines = [f"\n{'Online Order Details':^100}",
+             "=" * 110,
+             f"{column_header[0]:>8}  {column_header[1]:<25} {column_header[2]:<25} "
+             f"{column_header[3]:>5}  {column_header[4]:<12} {column_header[5]:>10}  {column_header[6]:<12}",
+             "-" * 110]
+    for row in page_rows:
+        lines.append(format_row(row))
+    count_stat('rows', len(page_rows))
+    lines.append("-" * 110)
+    page_count = max(1, -(-total // page_size))
+    lines.append(f"Page {start // page_size + 1} of {page_count}  "
+                 f"(records {start + 1} - {end} of {total})\n")
+    return "\n".join(lines)
+
 # Function to display records
-# Displays all order records from the parallel array on to the screen in a formatted table.
-def display_records():
+# Shows the order records from the parallel arrays one page at a time, or straight
+# from the database when the SQLite backend is used and nothing is loaded.
+# 'rows' limits the view to a list of row positions, such as query results;
+# 'plain_rows' shows a list of rows given as plain values instead (see stream_query).
+@instrumented
+def display_records(rows=None, plain_rows=None):
+
+    page_size = display_page_size
+    if plain_rows is not None:
+        total = len(plain_rows)
+        render = lambda start: format_page(plain_rows[start:start + page_size], start, total, page_size)
+    elif rows is None and use_database_view():
+        total = database_order_count()
+        if total == 0:
+            print(f"No records found in '{database_file_name}'.")
+            return
+        if records_not_saved:
+            print("Note: unsaved changes are shown once they are saved.")
+        render = database_page_renderer(total, page_size)
+    else:
+        # Drop any deleted rows so pages line up with the array positions
+        if rows is None:
+            compact_records()
+        total = len(order_id) if rows is None else len(rows)
+        render = lambda start: render_page(start, page_size, rows)
 
-    # Print  Application Title
-    print(f"\n{'Online Order Details':^100}")
-    print("=" * 110)
+    last_page_start = (total - 1) // page_size * page_size
+    start = 0
 
-    # Print column headers
-    print(f"{column_header[0]:>8}  {column_header[1]:<25} {column_header[2]:<25} "
-          f"{column_header[3]:>5}  {column_header[4]:<12} {column_header[5]:>10}  {column_header[6]:<12}")
-    print("-" * 110)
+    try:
+        while True:
+            # Write the whole page in one go
+            sys.stdout.write(render(start))
+            sys.stdout.flush()
+
+            choice = input("N = next, P = previous, J = jump to Order ID, Q = back to menu: ").strip().lower()
+            if choice in ('n', ''):
+                if start < last_page_start:
+                    start += page_size
+                else:
+                    print("This is the last page.")
+            elif choice == 'p':
+                if start > 0:
+                    start -= page_size
+                else:
+                    print("This is the first page.")
+            elif choice == 'j':
+                try:
+                    jump_id = int(input("Enter the Order ID to jump to: ").strip())
+                except ValueError:
+                    print("Invalid input. Please enter a valid integer for Order ID.")
+                    continue
+                if plain_rows is not None:
+                    index = next((position for position, row in enumerate(plain_rows) if row[0] == jump_id), None)
+                elif rows is None and use_database_view():
+                    index = database_position(jump_id)
+                else:
+                    index = find_row(jump_id)
+                    if index is not None and rows is not None:
+                        index = rows.index(index) if index in rows else None
+                if index is None:
+                    print(f"Order ID: {jump_id} not found.")
+                else:
+                    start = index // page_size * page_size
+            elif choice == 'q':
+                break
+            else:
+                print("Invalid input. Please enter N, P, J or Q.")
+    except KeyboardInterrupt:
+        print("\nDisplay stopped. Returning to main menu.")
+
+# Function to total the orders in each group of a column of group codes
+# 'codes' holds one small integer per row (a dictionary code or a day number), so
+# each report is a single pass over the arrays, or a numpy bincount when numpy is
+# installed. Returns a list of (code, order count, total quantity, total revenue)
+# for every group that has orders.
+def group_totals(codes, first_code=0):
+    compact_records()  # Deleted rows must not be counted
+    if numpy is not None:
+        group = numpy.frombuffer(codes, dtype=codes.typecode).astype(numpy.int64) - first_code
+        counts = numpy.bincount(group)
+        quantities = numpy.bincount(group, weights=numpy.frombuffer(quantity, dtype=quantity.typecode))
+        revenues = numpy.bincount(group, weights=numpy.frombuffer(total_price, dtype=total_price.typecode))
+        return [(code + first_code, int(counts[code]), int(quantities[code]), float(revenues[code]))
+                for code in numpy.flatnonzero(counts).tolist()]
+
+    group_count = (max(codes) - first_code + 1) if codes else 0
+    counts = [0] * group_count
+    quantities = [0] * group_count
+    revenues = [0.0] * group_count
+    for code, qty, price in zip(codes, quantity, total_price):
+        code -= first_code
+        counts[code] += 1
+        quantities[code] += qty
+        revenues[code] += price
+    return [(code + first_code, counts[code], quantities[code], revenues[code])
+            for code in range(group_count) if counts[code]]
+
+# Function to report order totals per status, item, customer or day
+# 'group_by' is 'status', 'item', 'customer' or 'day'. Returns a list of
+# (label, order count, total quantity, total revenue) sorted by 'sort_by'
+# ('revenue', 'quantity', 'count' or 'label'), largest first except for labels.
+def report_totals(group_by, sort_by='revenue'):
+    if use_file_view():
+        # Nothing loaded: total the stored orders directly instead
+        totals = stream_totals(group_by)
+    elif group_by == 'day':
+        first_day = min(order_date) if order_date else 0
+        # Groups come back in day order, which is also the label order
+        totals = [(format_date(day), count, qty, revenue)
+                  for day, count, qty, revenue in group_totals(order_date, first_day)]
+    else:
+        codes, table = {'status': (order_status, order_status_table),
+                        'item': (item_purchased, item_purchased_table),
+                        'customer': (customer_name, customer_name_table)}[group_by]
+        totals = [(table[code], count, qty, revenue)
+                  for code, count, qty, revenue in group_totals(codes)]
+
+    if sort_by != 'label':
+        position = {'count': 1, 'quantity': 2, 'revenue': 3}[sort_by]
+        totals.sort(key=lambda entry: entry[position], reverse=True)
+    elif group_by != 'day':
+        totals.sort()
+    return totals
+
+# Function to let the user pick and print an aggregate report
+def report_menu():
+
+    report_options = {
+        "1": ("Revenue by status", 'status', 'revenue'),
+        "2": ("Top items by quantity", 'item', 'quantity'),
+        "3": ("Revenue by customer", 'customer', 'revenue'),
+        "4": ("Daily revenue", 'day', 'label')
+    }
 
-    # Print each row
-    for i in range(len(order_id)):
-        # Format:
-        print(f"{order_id[i]:>8d}  "
-              f"{customer_name[i][:24]:<25} "
-              f"{item_purchased[i][:24]:<25} "
-              f"{quantity[i]:>5d}  "
-              f"{order_date[i]:<12} "
-              f"{total_price[i]:>10.2f}  "
-              f"{order_status[i][:14]:<15}")
+    print("\nSelect Report:")
+    for key, value in report_options.items():
+        print(f"{key}. {value[0]}")
+    choice = input("Enter the number corresponding to the report: ").strip()
+    if choice not in report_options:
+        print("Invalid choice. Returning to main menu.")
+        return
+
+    title, group_by, sort_by = report_options[choice]
+    sys.stdout.write(format_report(title, group_by, report_totals(group_by, sort_by)))
+
+# Function to build the text of a report from the totals returned by report_totals()
+def format_report(title, group_by, totals):
+    lines = [f"\n{title:^70}",
+             "=" * 70,
+             f"{group_by.capitalize():<30} {'Orders':>10} {'Qty':>10} {'Revenue':>15}",
+             "-" * 70]
+    for label, count, qty, revenue in totals:
+        lines.append(f"{str(label)[:29]:<30} {count:>10d} {qty:>10d} {revenue:>15.2f}")
+    lines.append("-" * 70)
+    lines.append(f"{'Total':<30} {sum(entry[1] for entry in totals):>10d} "
+                 f"{sum(entry[2] for entry in totals):>10d} {sum(entry[3] for entry in totals):>15.2f}\n")
+    return "\n".join(lines)
+
+# Function to search records by customer, item, status and date range
+# When nothing is loaded, the stored orders are searched directly instead.
+def query_menu():
+    if use_file_view():
+        print(f"\nNo records loaded: searching '{storage_name()}'.")
+        rows = stream_query(*input_query_filters())
+    else:
+        rows = query_records(*input_query_filters())
+    if not rows:
+        print("\nNo records match the query.")
+        return
+    print(f"\n{len(rows)} records match the query.")
+    order = input("Sort by I = Order ID, D = date (oldest first), N = newest first [I]: ").strip().lower()
+    order = {'d': 'date', 'n': 'newest'}.get(order, 'id')
+    if isinstance(rows[0], tuple):
+        display_records(plain_rows=sort_plain_rows(rows, order))
+    else:
+        display_records(sort_rows(rows, order))
 
+# Function to ask for the query filters
+# Returns (customer, item, status, date_from, date_to); blank fields match any value.
+def input_query_filters():
+
+    print("\nQuery Records (leave a field blank to match any value)")
+    print("-" * 55)
+    customer = input("Customer name: ").strip()
+    item = input("Item purchased: ").strip()
+    status = input("Order status (Shipped/Delivered/Cancelled): ").strip()
+
+    # Get the date range
+    while True:
+        date_from = input("From date (DD/MM/YYYY): ").strip()
+        date_to = input("To date (DD/MM/YYYY): ").strip()
+        try:
+            for date_text in (date_from, date_to):
+                if date_text:
+                    parse_date(date_text)
+            break
+        except ValueError:
+            print("Invalid date. Please use the DD/MM/YYYY format.")
+
+    return customer, item, status, date_from, date_to
+
+
+# Function to turn a column name from an import file into a field key (None if unknown)
+def import_field_key(column_name):
+    letters = "".join(char for char in str(column_name).lower() if char.isalpha())
+    return import_field_names.get(letters)
+
+# Function to read the rows of a bulk import file
+# CSV files need a header row; files ending in .jsonl or .json hold one JSON object
+# per line. Yields (line number, dictionary of field key -> text) for each row.
+def read_import_rows(import_file_name):
+    with open(import_file_name, mode='r', newline='') as import_obj:
+        if import_file_name.lower().endswith(('.jsonl', '.json')):
+            for line_number, line in enumerate(import_obj, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    yield line_number, None
+                    continue
+                if not isinstance(entry, dict):
+                    yield line_number, None
+                    continue
+                yield line_number, {import_field_key(key): value for key, value in entry.items()}
+        else:
+            csv_reader = csv.reader(import_obj)
+            keys = [import_field_key(column) for column in next(csv_reader, [])]
+            for row in csv_reader:
+                if row:
+                    yield csv_reader.line_num, dict(zip(keys, row))
+
+# Function to check one import row with the same rules as Add record
+# Returns (name, item, qty, date, price, status) or raises ValueError with the reason.
+def validate_import_row(fields, today):
+    if fields is None:
+        raise ValueError("not a valid JSON object")
+
+    # JSON values can be of any type: text fields must be text (a missing one is empty)
+    for key, label in (("name", "customer name"), ("item", "item purchased"), ("status", "status")):
+        if fields.get(key) is not None and not isinstance(fields[key], str):
+            raise ValueError(f"{label} '{fields[key]}' is not text")
+
+    name = (fields.get("name") or "").strip()
+    item = (fields.get("item") or "").strip()
+    if not name:
+        raise ValueError("customer name is empty")
+    if not item:
+        raise ValueError("item purchased is empty")
+    # Journal lines are read one line at a time, so text must stay on one line
+    if "\n" in name or "\r" in name or "\n" in item or "\r" in item:
+        raise ValueError("name or item contains a line break")
+
+    # JSON numbers arrive as int, float or bool: only whole numbers are quantities
+    # (True would otherwise count as 1 and 2.9 as 2), and no bool, nan or inf is a price
+    qty = fields.get("qty")
+    try:
+        if isinstance(qty, bool) or isinstance(qty, float) and not qty.is_integer():
+            raise ValueError
+        qty = int(qty)
+    except (TypeError, ValueError):
+        raise ValueError(f"quantity '{fields.get('qty')}' is not an integer") from None
+    try:
+        if isinstance(fields.get("price"), bool):
+            raise ValueError
+        price = float(fields.get("price"))
+        if not math.isfinite(price):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f"total price '{fields.get('price')}' is not a number") from None
+
+    status = (fields.get("status") or "").strip().capitalize()
+    if status not in valid_statuses:
+        raise ValueError(f"status '{fields.get('status')}' is not Shipped, Delivered or Cancelled")
+
+    # The order date is optional and defaults to today
+    date = str(fields.get("date") or "").strip() or today
+    try:
+        parse_date(date)
+    except ValueError:
+        raise ValueError(f"order date '{date}' is not in DD/MM/YYYY format")
+
+    return name, item, qty, date, price, status
+
+# Function to add many orders from a CSV or JSON-lines file without prompts
+# Rows are validated in batches, all valid rows get their Order IDs from one block
+# allocation and are appended to the parallel arrays together. Rejected rows are
+# reported and written to '<import file>.rejects.csv' with their line numbers.
+# Returns the number of orders added.
+def import_orders(import_file_name):
+    today = datetime.datetime.now().strftime(date_format)
+    valid_rows = []
+    rejected = []
+
+    try:
+        batch = []
+        for line_number, fields in read_import_rows(import_file_name):
+            batch.append((line_number, fields))
+            if len(batch) >= import_batch_size:
+                validate_import_batch(batch, today, valid_rows, rejected)
+                batch = []
+        validate_import_batch(batch, today, valid_rows, rejected)
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"\nError reading '{import_file_name}': {e}")
+        return 0
+
+    if valid_rows:
+        # Reserve every Order ID in one step
+        first_id = new_last_row_id(len(valid_rows))
+        if first_id is None:
+            print("Could not generate new Order IDs. Nothing was imported.")
+            return 0
+
+        # Rebuild the secondary indexes once for large imports instead of row by row
+        rebuild_indexes = len(valid_rows) > len(order_index) // 10
+        set_indexes_ready(not rebuild_indexes)
+        for offset, row in enumerate(valid_rows):
+            add_order(first_id + offset, *row)
+        if rebuild_indexes:
+            build_secondary_indexes()
+
+    print(f"\n{len(valid_rows)} orders imported from '{import_file_name}'.")
+    if rejected:
+        rejects_name = reject_file_name(import_file_name)
+        write_rejects(rejects_name, rejected, [])
+        print_rejects(rejected, rejects_name)
+    return len(valid_rows)
+
+# Function to validate one batch of import rows into the valid and rejected lists
+def validate_import_batch(batch, today, valid_rows, rejected):
+    for line_number, fields in batch:
+        try:
+            valid_rows.append(validate_import_row(fields, today))
+        except ValueError as e:
+            rejected.append((line_number, str(e)))
+
+# Function to ask for a file and bulk import it from the menu
+def bulk_import_menu():
+    print("\nBulk Import")
+    print("-" * 30)
+    import_file_name = input("Enter the CSV or JSON-lines file to import: ").strip()
+    if import_file_name:
+        import_orders(import_file_name)
+
+# Function to add one order to the parallel arrays and the changes waiting to be saved
+# Returns the row position of the new order.
+def add_order(new_order_id, name, item, qty, date, price, status):
+    global records_not_saved
+    index = append_row(new_order_id, name, item, qty, date, price, status)
+    pending_changes.append(['A', *get_row(index)])
+    records_not_saved = True
+    count_stat('rows')
+    return index
+
+# Function to delete one order by Order ID and record the change for saving
+# With the SQLite or partitions backend, orders that are not in memory are looked up
+# in the database or in the partitions that were not loaded. Returns True if the order was found and deleted.
+def delete_order(del_order_id):
+    global records_not_saved
+    index = find_row(del_order_id)
+    if index is not None:
+        remove_row(index)
+    elif not stored_order_ids([del_order_id]):
+        return False
+    pending_changes.append(['D', del_order_id])
+    records_not_saved = True
+    count_stat('rows')
+    return True
+
+# Function to read a list of Order IDs and ranges such as "1001-1050, 1060"
+# Raises ValueError for anything that is not an Order ID or a range, and when the
+# list names more than batch_max_ids Order IDs (checked before any range is expanded).
+def parse_order_ids(text):
+    order_ids = []
+    for part in text.replace(" ", ",").split(","):
+        if not part:
+            continue
+        first, separator, last = part.partition("-")
+        try:
+            if separator:
+                first, last = int(first), int(last)
+                if last < first:
+                    raise ValueError
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"'{part}' is not an Order ID or range") from None
+        if len(order_ids) + last - first + 1 > batch_max_ids:
+            raise ValueError(f"more than {batch_max_ids} Order IDs selected")
+        order_ids.extend(range(first, last + 1))
+    return order_ids
+
+# Function to split Order IDs into the orders that exist and the IDs that do not
+# Orders count as existing when they are in memory or stored where they were not loaded
+# from (see stored_order_ids). Duplicates are dropped. Returns (existing IDs, missing IDs).
+def find_existing_orders(order_ids):
+    order_ids = list(dict.fromkeys(order_ids))
+    missing = [find_order_id for find_order_id in order_ids if find_order_id not in order_index]
+    if missing:
+        stored = stored_order_ids(missing)
+        missing = [find_order_id for find_order_id in missing if find_order_id not in stored]
+    missing_set = set(missing)
+    return [find_order_id for find_order_id in order_ids if find_order_id not in missing_set], missing
+
+# Function to delete many orders in one pass
+# The rows are marked as deleted and dropped by a single compaction of the columns.
+# Large batches take every row out of order_index first and then count their index
+# entries as stale at once, so the secondary indexes are purged at most once.
+# Returns (deleted Order IDs, Order IDs not found).
+def batch_delete(order_ids):
+    global records_not_saved
+    found, missing = find_existing_orders(order_ids)
+    rows = [order_index[del_order_id] for del_order_id in found if del_order_id in order_index]
+
+    if indexes_ready and len(rows) >= batch_index_min_rows:
+        set_indexes_ready(False)
+        for index in rows:
+            remove_row(index, compact=False)
+        set_indexes_ready(True)
+        unindex_rows(rows)
+    else:
+        for index in rows:
+            remove_row(index, compact=False)
+    compact_records()
+
+    pending_changes.extend(['D', del_order_id] for del_order_id in found)
+    if found:
+        records_not_saved = True
+    count_stat('rows', len(found))
+    return found, missing
+
+# Function to set the status of many orders
+# Only the status column (and the status index) changes, so no compaction is needed.
+# Returns (updated Order IDs, Order IDs not found).
+def batch_update_status(order_ids, status):
+    global records_not_saved
+    found, missing = find_existing_orders(order_ids)
+    for update_order_id in found:
+        index = find_row(update_order_id)
+        if index is not None:
+            set_row_status(index, status)
+        pending_changes.append(['U', update_order_id, status])
+    if found:
+        records_not_saved = True
+    count_stat('rows', len(found))
+    return found, missing
+
+# Function to describe a batch of orders before it is changed
+def batch_summary(order_ids):
+    status_counts = {}
+    total_value = 0.0
+    for batch_order_id in order_ids:
+        index = find_row(batch_order_id)
+        if index is not None:
+            status = order_status_table[order_status[index]]
+            status_counts[status] = status_counts.get(status, 0) + 1
+            total_value += total_price[index]
+
+    lines = [f"{len(order_ids)} orders selected (Order IDs {min(order_ids)} - {max(order_ids)})."]
+    if status_counts:
+        lines.append(", ".join(f"{count} {status}" for status, count in sorted(status_counts.items()))
+                     + f"; total value {total_value:.2f}.")
+    not_loaded = len(order_ids) - sum(status_counts.values())
+    if not_loaded:
+        store_name = partition_folder if storage_backend == 'partitions' else database_file_name
+        lines.append(f"{not_loaded} of them are only in '{store_name}'.")
+    return "\n".join(lines)
+
+# Function to ask for an order status from the list of valid statuses
+def input_status():
+    status_options = {str(number): value for number, value in enumerate(valid_statuses, 1)}
+
+    while True:
+        print("\nSelect Order Status:")
+        for key, value in status_options.items():
+            print(f"{key}. {value}")
+
+        choice = input("Enter the number corresponding to the status: ").strip()
+
+        if choice in status_options:
+            return status_options[choice]
+        print("Invalid choice. Please enter 1, 2, or 3.")
+
+# Function to delete or update the status of many orders with one confirmation
+# Orders are selected by a list of Order IDs and ranges, or by a query filter.
+def batch_menu():
+
+    print("\nBatch Delete / Status Update")
+    print("-" * 30)
+    print("1. Delete orders")
+    print("2. Update order status")
+    action = input("Enter the number corresponding to the operation: ").strip()
+    if action not in ("1", "2"):
+        print("Invalid choice. Returning to main menu.")
+        return
+    status = input_status() if action == "2" else None
+
+    print("\nI. Select by Order IDs and ranges (for example 1001-1050, 1060)")
+    print("F. Select by query filter")
+    selection = input("Enter I or F: ").strip().lower()
+    if selection == 'i':
+        try:
+            order_ids = parse_order_ids(input("Enter the Order IDs: "))
+        except ValueError as e:
+            print(f"Invalid input: {e}.")
+            return
+    elif selection == 'f':
+        if check_empty():
+            return
+        order_ids = [order_id[i] for i in query_records(*input_query_filters())]
+    else:
+        print("Invalid choice. Returning to main menu.")
+        return
+
+    found, missing = find_existing_orders(order_ids)
+    if missing:
+        print(f"\n{len(missing)} Order IDs not found: {', '.join(map(str, missing[:10]))}"
+              + (" ..." if len(missing) > 10 else ""))
+    if not found:
+        print("No matching orders. Nothing changed.")
+        return
+
+    print("\n" + batch_summary(found))
+    operation_text = "delete them" if status is None else f"set their status to {status}"
+    while True:
+        confirm = input(f"Are you sure you want to {operation_text}? (Y/N): ").strip().lower()
+        if confirm == 'y':
+            if status is None:
+                done = batch_delete(found)[0]
+                print(f"\n{len(done)} orders deleted successfully!")
+            else:
+                done = batch_update_status(found, status)[0]
+                print(f"\n{len(done)} orders set to {status} successfully!")
+            break
+        elif confirm == 'n':
+            print("Batch operation cancelled.")
+            break
+        print("Invalid input. Please enter 'Y' for yes or 'N' for no.")
 
 # Function to add record
 # Allows the user to input a new order and appends it to the parallel arrays.
+@instrumented
 def add_record():
 
-    global records_not_saved  # Flag to track whether data added to in-memory has been saved to csv file
-
     print("\nAdd New Order")
     print("-" * 30)
 
-    # Auto-generate a new Order ID
-    if order_id:
-        new_id = order_id[-1] + 1 # Increment Order ID based on the last entry in the parallel array
-    else:
-        new_id = new_last_row_id() # If array is empty, get the last ID from the CSV file and increment
+    # Auto-generate a new Order ID from the saved high-water mark
+    new_id = new_last_row_id()
+    if new_id is None:
+        print("Could not generate a new Order ID. Please try again.")
+        return
 
     # Get customer name
     while True:
@@ -251,43 +3255,18 @@ def add_record():
     """
 
     # Display menu for selecting order status
-    status_options = {
-        "1": "Shipped",
-        "2": "Delivered",
-        "3": "Cancelled"
-    }
-
-    while True:
-        print("\nSelect Order Status:")
-        for key, value in status_options.items():
-            print(f"{key}. {value}")
-
-        choice = input("Enter the number corresponding to the status: ").strip()
-
-        if choice in status_options:
-            status = status_options[choice]
-            break
-        else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+    status = input_status()
 
     # Append to the parallel array
-    order_id.append(int(new_id))
-    customer_name.append(name)
-    item_purchased.append(item)
-    quantity.append(qty)
-    order_date.append(date)
-    total_price.append(price)
-    order_status.append(status)
+    add_order(int(new_id), name, item, qty, date, price, status)
 
     print("\nRecord added successfully!")
-    records_not_saved = True
 
 # Function to delete record
 # Deletes a specific order from the arrays based on the entered Order ID.
+@instrumented
 def delete_record():
 
-    global records_not_saved
-
     print("\nDelete Record")
     print("-" * 20)
 
@@ -298,35 +3277,35 @@ def delete_record():
         except ValueError:
             print("Invalid input. Please enter a valid integer for Order ID.")
 
-    if del_order_id in order_id:
-        index = order_id.index(del_order_id)
+    # Look up the row through the Order ID index (or in the database)
+    index = find_row(del_order_id)
+    if index is not None:
+        row = get_row(index)
+    elif storage_backend == 'sqlite':
+        row = fetch_database_order(del_order_id)
+    else:
+        row = None
+    if row is not None:
 
         # Show the record details before confirming deletion
         print("\nRecord to be deleted:")
         print("-" * 80)
-        print(f"Order ID   : {order_id[index]}")
-        print(f"Customer   : {customer_name[index]}")
-        print(f"Item       : {item_purchased[index]}")
-        print(f"Quantity   : {quantity[index]}")
-        print(f"Date       : {order_date[index]}")
-        print(f"Total Price: {total_price[index]:.2f}")
-        print(f"Status     : {order_status[index]}")
+        print(f"Order ID   : {row[0]}")
+        print(f"Customer   : {row[1]}")
+        print(f"Item       : {row[2]}")
+        print(f"Quantity   : {row[3]}")
+        print(f"Date       : {row[4]}")
+        print(f"Total Price: {row[5]:.2f}")
+        print(f"Status     : {row[6]}")
         print("-" * 50)
 
         while True:
             confirm = input("Are you sure you want to delete this record? (Y/N): ").strip().lower()
             if confirm == 'y':
-                # Remove the item at the same index from all parallel arrays
-                order_id.pop(index)
-                customer_name.pop(index)
-                item_purchased.pop(index)
-                quantity.pop(index)
-                order_date.pop(index)
-                total_price.pop(index)
-                order_status.pop(index)
+                # Mark the row as deleted in all parallel arrays
+                delete_order(del_order_id)
 
                 print(f"\nOrder ID: {del_order_id} deleted successfully!")
-                records_not_saved = True
                 break
             elif confirm == 'n':
                 print("Deletion cancelled.")
@@ -337,6 +3316,8 @@ def delete_record():
 
 # Function to save records
 # Saves all current records from the parallel arrays to OrderDetails.csv.
+@instrumented
+@storage_locked(exclusive=True)
 def save_records():
 
     global records_not_saved  # Flag to track whether data added to in-memory has been saved to csv file
@@ -344,41 +3325,113 @@ def save_records():
 
     try:
 
-        # Check opening file in write or append mode
-        if not records_loaded:
-            print("Note: Your new entries will be added to the existing records in the file.")
-            set_file_mode = 'a' # Append mode if records were not loaded
-        else:
-            set_file_mode = 'w' # Overwrite mode if records were loaded
-
-        with open(file_name, mode=set_file_mode, newline='') as csv_file_obj:
+        # The database stores the changes in one transaction, loaded or not
+        if storage_backend == 'sqlite':
+            change_count = len(pending_changes)
+            write_database_changes()
+            print(f"\nRecords successfully saved ({change_count} changes written to '{database_file_name}').")
+            records_not_saved = False
+            return
+
+        # Another session may have saved since the records were loaded
+        if not merge_other_sessions():
+            return
+
+        # Partitions are written where the changes fall, loaded or not
+        if storage_backend == 'partitions':
+            change_count = len(pending_changes)
+            partition_count = write_partition_changes()
+            stamp_storage_change()
+            print(f"\nRecords successfully saved ({change_count} changes written to "
+                  f"{partition_count} partitions in '{partition_folder}').")
+            records_not_saved = False
+            return
+
+        # Loaded records are saved by appending only the changes to the journal
+        if records_loaded:
+            change_count = len(pending_changes)
+            write_journal_batch()
+            stamp_storage_change()
+            count_stat('rows', change_count)
+            print(f"\nRecords successfully saved ({change_count} changes written to '{journal_file_name}').")
+            records_not_saved = False
+
+            # Fold a long journal back into the CSV file
+            if journal_op_count >= journal_compact_ops:
+                row_count = compact_storage()
+                print(f"Storage compacted: {row_count} records written to '{file_name}'.")
+            return
+
+        # Records were not loaded, so add the new entries to the end of the file
+        print("Note: Your new entries will be added to the existing records in the file.")
+
+        # Drop any deleted rows before writing
+        compact_records()
+
+        # Start on a new line if the file does not end with a line break
+        add_line_break = missing_final_newline(file_name)
+
+        start_size = os.path.getsize(file_name) if os.path.exists(file_name) else 0
+        with open_order_file(file_name, 'a') as csv_file_obj:
             csv_writer = csv.writer(csv_file_obj)
-
-            # Write header only in write ('w') mode
-            if set_file_mode == 'w':
-                csv_writer.writerow(column_header)
+            if add_line_break:
+                csv_file_obj.write("\r\n")
 
             # Write each row from parallel arrays
             for i in range(len(order_id)):
-                csv_writer.writerow([
-                    order_id[i],
-                    customer_name[i],
-                    item_purchased[i],
-                    quantity[i],
-                    order_date[i],
-                    total_price[i],
-                    order_status[i]
-                ])
-
-        if set_file_mode == 'a':
-            print("\nRecords successfully appended to 'OrderDetails.csv'.")
-        else:
-            print("\nRecords successfully saved to 'OrderDetails.csv'.")
+                csv_writer.writerow(get_row(i))
+        stamp_storage_change()
+        count_stat('rows', len(order_id))
+        count_stat('bytes_written', os.path.getsize(file_name) - start_size)
+
+        print(f"\nRecords successfully appended to '{file_name}'.")
+        pending_changes.clear()
         records_not_saved = False
 
     except Exception as e:
         print(f"\nError saving records: {e}")
 
+# Function to show the operation statistics and change the instrumentation settings
+def stats_menu():
+    global stats_enabled
+    global profile_operation
+    global profile_mode
+
+    while True:
+        sys.stdout.write(format_stats())
+        print(f"Statistics are {'on' if stats_enabled else 'off'}."
+              + (f" Next '{profile_operation}' will be profiled with {profile_mode}." if profile_operation else ""))
+        choice = input("E = switch statistics on/off, P = profile one operation, J = save as JSON, "
+                       "R = reset, Q = back to menu: ").strip().lower()
+        if choice == 'e':
+            stats_enabled = not stats_enabled
+        elif choice == 'p':
+            options = {str(number): name for number, name in enumerate(instrumented_operations, 1)}
+            for key, name in options.items():
+                print(f"{key}. {name}")
+            choice = input("Enter the number of the operation to profile: ").strip()
+            if choice not in options:
+                print("Invalid choice.")
+                continue
+            mode = input("Profiler - C = cProfile (time), T = tracemalloc (memory): ").strip().lower()
+            profile_mode = 'tracemalloc' if mode == 't' else 'cprofile'
+            profile_operation = options[choice]
+            print(f"The next run of '{profile_operation}' will be profiled.")
+        elif choice == 'j':
+            stats_file_name = input("Enter the JSON file name: ").strip()
+            if stats_file_name:
+                try:
+                    write_stats_json(stats_file_name)
+                    print(f"Statistics saved to '{stats_file_name}'.")
+                except OSError as e:
+                    print(f"Error saving statistics: {e}")
+        elif choice == 'r':
+            reset_stats()
+        elif choice == 'q':
+            break
+        else:
+            print("Invalid input. Please enter E, P, J, R or Q.")
+
 
 # Function to display main menu
 def display_menu():
@@ -388,29 +3441,58 @@ def display_menu():
         print("=" * 25)
         print(f"{'Main Menu':^25}  ")
         print("-" * 25)
+        if records_loaded and indexes_ready:
+            print(format_summary())
+            print("-" * 25)
         print("1. Load records")
         print("2. Display")
         print("3. Add record")
         print("4. Delete record")
         print("5. Save records")
-        print("6. Exit")
-        choice = input("Enter the number (1 - 6) corresponding to the menu: ").strip()
+        print("6. Compact storage")
+        print("7. Convert CSV / snapshot")
+        print("8. Query records")
+        print("9. Reports")
+        print("10. Bulk import")
+        print("11. Batch delete / update")
+        print("12. Stats")
+        print("13. Refresh records")
+        print("14. Exit")
+        choice = input("Enter the number (1 - 14) corresponding to the menu: ").strip()
         #choice = input().strip()
 
         if choice == "1":
             load_records()
         elif choice == "2":
-            if not check_empty():
+            if use_database_view() or not check_empty():
                 display_records()
         elif choice == "3":
             add_record()
         elif choice == "4":
-            if not check_empty():
+            if use_database_view() or not check_empty():
                 delete_record()
         elif choice == "5":
             if not check_empty() or records_not_saved:
                 save_records()
         elif choice == "6":
+            compact_files()
+        elif choice == "7":
+            convert_files()
+        elif choice == "8":
+            if use_file_view() or not check_empty():
+                query_menu()
+        elif choice == "9":
+            if use_file_view() or not check_empty():
+                report_menu()
+        elif choice == "10":
+            bulk_import_menu()
+        elif choice == "11":
+            batch_menu()
+        elif choice == "12":
+            stats_menu()
+        elif choice == "13":
+            refresh_records()
+        elif choice == "14":
 
             while True:
                 confirm = input("Are you sure you want to exit the application? (Y/N): ").strip().lower()
@@ -423,7 +3505,288 @@ def display_menu():
                     break
                 print("Invalid input. Please enter 'Y' for yes or 'N' for no.")
         else:
-            print("Please enter valid number (1 - 6) from the menu.")
+            print("Please enter valid number (1 - 14) from the menu.")
+
+# Function to add the order selection options of the batch operations to a parser
+def add_selection_arguments(operation_parser):
+    operation_parser.add_argument('order_ids', nargs='*', metavar='ORDER_ID',
+                                  help="Order IDs or ranges such as 1001-1050")
+    operation_parser.add_argument('--customer', help="only orders of this customer")
+    operation_parser.add_argument('--item', help="only orders of this item")
+    operation_parser.add_argument('--status', help="only orders with this status")
+    operation_parser.add_argument('--from', dest='date_from', help="only orders on or after this date (DD/MM/YYYY)")
+    operation_parser.add_argument('--to', dest='date_to', help="only orders on or before this date (DD/MM/YYYY)")
+
+# Function to build the command line parser for one operation
+def build_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog='main.py',
+        description="Online Order Details. Run without arguments for the interactive menu.",
+        epilog="Chain operations with '+' to run them over one loaded dataset, for example: "
+               "main.py load + query --status Cancelled + report status + save")
+    parser.add_argument('--backend', choices=('csv', 'sqlite', 'partitions'), default=None,
+                        help="storage backend for every operation (default from storage_backend)")
+    commands = parser.add_subparsers(dest='command', metavar='operation', required=True)
+
+    load_parser = commands.add_parser('load', help="load records (discards unsaved changes)")
+    load_parser.add_argument('--window', type=int, default=None,
+                             help="keep only the most recent N orders in memory")
+    load_parser.add_argument('--source', choices=('csv', 'snapshot', 'database', 'partitions'), default=None,
+                             help="load from this file instead of the fresher one")
+    load_parser.add_argument('--from', dest='date_from',
+                             help="partitions only: skip months before this date (DD/MM/YYYY)")
+    load_parser.add_argument('--to', dest='date_to',
+                             help="partitions only: skip months after this date (DD/MM/YYYY)")
+    load_parser.add_argument('--status', help="partitions only: skip months without orders of this status")
+    load_parser.add_argument('--workers', type=int, default=None,
+                             help="parse a large CSV file with this many worker processes")
+
+    commands.add_parser('refresh', help="read only the orders and changes saved since the last load")
+
+    show_parser = commands.add_parser('show', help="print records")
+    show_parser.add_argument('--page', type=int, default=None, help="print only this page (from 1)")
+    show_parser.add_argument('--page-size', type=int, default=None, help="rows per page")
+    show_parser.add_argument('--sort', choices=('id', 'date', 'newest'), default='id',
+                             help="order of the rows (needs loaded records for date orders)")
+
+    add_parser = commands.add_parser('add', help="add one order")
+    add_parser.add_argument('--name', required=True, help="customer name")
+    add_parser.add_argument('--item', required=True, help="item purchased")
+    add_parser.add_argument('--qty', required=True, help="quantity")
+    add_parser.add_argument('--price', required=True, help="total price")
+    add_parser.add_argument('--status', required=True, help="Shipped, Delivered or Cancelled")
+    add_parser.add_argument('--date', default=None, help="order date in DD/MM/YYYY (default today)")
+
+    delete_parser = commands.add_parser('delete', help="delete orders by Order ID, range or filter")
+    add_selection_arguments(delete_parser)
+
+    status_parser = commands.add_parser('set-status', help="set the status of orders by Order ID, range or filter")
+    status_parser.add_argument('new_status', metavar='STATUS', help="Shipped, Delivered or Cancelled")
+    add_selection_arguments(status_parser)
+
+    query_parser = commands.add_parser('query', help="print the orders that match every filter")
+    query_parser.add_argument('--customer', help="customer name")
+    query_parser.add_argument('--item', help="item purchased")
+    query_parser.add_argument('--status', help="order status")
+    query_parser.add_argument('--from', dest='date_from', help="first order date (DD/MM/YYYY)")
+    query_parser.add_argument('--to', dest='date_to', help="last order date (DD/MM/YYYY)")
+    query_parser.add_argument('--sort', choices=('id', 'date', 'newest'), default='id',
+                              help="order of the matching rows (default Order ID)")
+
+    report_parser = commands.add_parser('report', help="print order totals per group")
+    report_parser.add_argument('group_by', choices=('status', 'item', 'customer', 'day'))
+    report_parser.add_argument('--sort', choices=('revenue', 'quantity', 'count', 'label'), default=None,
+                               help="order of the groups (default revenue, or label for day)")
+
+    summary_parser = commands.add_parser('summary', help="print the running totals of the orders in memory")
+    summary_parser.add_argument('--verify', action='store_true', help="also check them against a full recompute")
+
+    import_parser = commands.add_parser('import', help="bulk import a CSV or JSON-lines file")
+    import_parser.add_argument('import_file', metavar='FILE')
+
+    commands.add_parser('save', help="save changes")
+    commands.add_parser('compact', help="fold the journal into the CSV file (partitions: rebuild the manifest)")
+
+    stats_parser = commands.add_parser('stats', help="switch on and print operation statistics")
+    stats_parser.add_argument('--on', action='store_true', help="start collecting statistics")
+    stats_parser.add_argument('--json', metavar='FILE', help="save the statistics as JSON")
+    stats_parser.add_argument('--profile', choices=instrumented_operations, metavar='OPERATION',
+                              help="profile the next run of this operation: "
+                                   + ", ".join(instrumented_operations))
+    stats_parser.add_argument('--profile-mode', choices=('cprofile', 'tracemalloc'), default='cprofile',
+                              help="profiler used with --profile (default cprofile)")
+    return parser
+
+# Function to print records (all of them, or one page) without prompting
+# 'rows' and 'plain_rows' limit the output as in display_records.
+@instrumented
+def print_records(rows=None, page=None, page_size=None, plain_rows=None):
+    page_size = page_size or display_page_size
+    if plain_rows is not None:
+        total = len(plain_rows)
+        render = lambda start: format_page(plain_rows[start:start + page_size], start, total, page_size)
+    elif rows is None and use_database_view():
+        total = database_order_count()
+        render = database_page_renderer(total, page_size)
+    else:
+        if rows is None:
+            compact_records()
+        total = len(order_id) if rows is None else len(rows)
+        render = lambda start: render_page(start, page_size, rows)
+    starts = range(0, total, page_size) if page is None else [(page - 1) * page_size]
+    for start in starts:
+        if 0 <= start < total:
+            sys.stdout.write(render(start))
+
+# Function to get the Order IDs chosen by the selection options of a batch operation
+# With both Order IDs and filters, only the listed orders that match the filters are
+# chosen. Returns the list of Order IDs, or None if the options are invalid.
+def selected_order_ids(args):
+    try:
+        order_ids = parse_order_ids(",".join(args.order_ids))
+    except ValueError as e:
+        print(f"Invalid Order IDs: {e}.")
+        return None
 
-# To display main menu
-display_menu()
\ No newline at end of file
+    filters = (args.customer, args.item, args.status, args.date_from, args.date_to)
+    if any(filters):
+        if check_empty():
+            return None
+        try:
+            matches = [order_id[i] for i in query_records(*filters)]
+        except ValueError:
+            print("Invalid date. Please use the DD/MM/YYYY format.")
+            return None
+        if not order_ids:
+            return matches
+        matches = set(matches)
+        return [match_order_id for match_order_id in order_ids if match_order_id in matches]
+
+    if not order_ids:
+        print("Please give Order IDs, ranges or filters.")
+        return None
+    return order_ids
+
+# Function to run one command line operation
+# Returns True if the operation succeeded.
+def run_cli_operation(args):
+    global load_window_size
+    global parse_workers
+    global stats_enabled
+    global profile_operation
+    global profile_mode
+
+    if args.command == 'load':
+        if args.window is not None:
+            load_window_size = args.window
+        if args.workers is not None:
+            parse_workers = args.workers
+        load_records(args.source, confirm=False, date_from=args.date_from,
+                     date_to=args.date_to, status=args.status)
+        return records_loaded
+    elif args.command == 'refresh':
+        refresh_records(confirm=False)
+        return records_loaded
+    elif args.command == 'show':
+        if args.sort != 'id':
+            # Date orders come from the sorted date index of the loaded records
+            if not check_empty():
+                print_records(date_range_rows(descending=args.sort == 'newest'), args.page, args.page_size)
+        elif use_database_view() or not check_empty():
+            print_records(page=args.page, page_size=args.page_size)
+    elif args.command == 'add':
+        try:
+            row = validate_import_row(vars(args), datetime.datetime.now().strftime(date_format))
+        except ValueError as e:
+            print(f"Invalid order: {e}.")
+            return False
+        new_id = new_last_row_id()
+        if new_id is None:
+            return False
+        add_order(new_id, *row)
+        print(f"Order ID: {new_id} added.")
+    elif args.command in ('delete', 'set-status'):
+        order_ids = selected_order_ids(args)
+        if order_ids is None:
+            return False
+        if args.command == 'delete':
+            done, missing = batch_delete(order_ids)
+            print(f"{len(done)} orders deleted.")
+        else:
+            status = args.new_status.strip().capitalize()
+            if status not in valid_statuses:
+                print(f"Invalid status. Please use {', '.join(valid_statuses)}.")
+                return False
+            done, missing = batch_update_status(order_ids, status)
+            print(f"{len(done)} orders set to {status}.")
+        if missing:
+            print(f"Order IDs not found: {', '.join(map(str, missing))}")
+            return False
+    elif args.command == 'query':
+        filters = (args.customer, args.item, args.status, args.date_from, args.date_to)
+        try:
+            file_view = use_file_view()
+            rows = stream_query(*filters) if file_view else query_records(*filters)
+        except ValueError:
+            print("Invalid date. Please use the DD/MM/YYYY format.")
+            return False
+        print(f"{len(rows)} records match the query.")
+        if rows and file_view:
+            print_records(plain_rows=sort_plain_rows(rows, args.sort))
+        elif rows:
+            print_records(sort_rows(rows, args.sort))
+    elif args.command == 'report':
+        sort_by = args.sort or ('label' if args.group_by == 'day' else 'revenue')
+        title = f"Totals by {args.group_by}"
+        sys.stdout.write(format_report(title, args.group_by, report_totals(args.group_by, sort_by)))
+    elif args.command == 'summary':
+        print(format_summary())
+        if args.verify:
+            differences = verify_summary()
+            for difference in differences:
+                print(f"Mismatch: {difference}")
+            print(f"{len(differences)} differences from a full recompute." if differences
+                  else "The summary matches a full recompute.")
+            return not differences
+    elif args.command == 'import':
+        import_orders(args.import_file)
+    elif args.command == 'save':
+        if not records_not_saved:
+            print("No changes to save.")
+        else:
+            save_records()
+            return not records_not_saved
+    elif args.command == 'compact':
+        compact_files()
+    elif args.command == 'stats':
+        if args.profile:
+            profile_operation = args.profile
+            profile_mode = args.profile_mode
+        if args.on:
+            stats_enabled = True
+        if args.json:
+            write_stats_json(args.json)
+            print(f"Statistics saved to '{args.json}'.")
+        if not (args.on or args.json or args.profile):
+            sys.stdout.write(format_stats())
+    return True
+
+# Function to run a chain of command line operations over one loaded dataset
+# Operations are separated by '+'. All of them are parsed before any is run, so a
+# typo fails without touching the data. Returns the process exit code.
+def run_cli(argv):
+    global storage_backend
+    parser = build_cli_parser()
+    operations = [[]]
+    for arg in argv:
+        if arg == '+':
+            operations.append([])
+        else:
+            operations[-1].append(arg)
+    parsed_operations = [parser.parse_args(operation) for operation in operations]
+
+    for args in parsed_operations:
+        if args.backend:
+            storage_backend = args.backend
+        if not run_cli_operation(args):
+            print(f"Operation '{args.command}' failed. Stopping.")
+            return 1
+    return 0
+
+# Function to start the application
+# Without arguments the interactive menu is shown; otherwise the arguments are run
+# as command line operations. 'python main.py --import FILE' is kept as a shortcut
+# for 'python main.py import FILE + save'.
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        display_menu()
+        return 0
+    if len(argv) == 2 and argv[0] == '--import':
+        argv = ['import', argv[1], '+', 'save']
+    return run_cli(argv)
+
+
+# To display main menu or run the command line operations when run as a script
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,380 @@
+"""
+--------------------------------------------------------
+Title       : OrderInfoSystem - Order Server
+File        : order_server.py
+
+Description :
+Serves one in-memory order store to many clients at once.
+
+The orders are loaded once when the server starts. Clients connect over a
+local TCP or Unix socket and send one JSON request per line; each request
+gets one JSON response line back, in the order the requests were sent.
+
+- get, query, report and summary are answered straight from memory, so any number
+  of readers can be served between writes
+- add, delete and set_status go through a single writer task, which applies
+  the writes waiting in its queue together and saves them with one save
+  (group commit); the response is sent once the change is saved
+- while another session holds the order files, the writer waits for them
+  without blocking, so reads keep being answered
+
+Request examples:
+    {"op": "get", "order_id": 1001}
+    {"op": "query", "status": "Cancelled", "date_from": "01/04/2025", "sort": "newest", "limit": 50}
+    {"op": "report", "group_by": "item", "sort": "quantity"}
+    {"op": "summary"}
+    {"op": "add", "name": "Alice Johnson", "item": "Mouse", "qty": 1, "price": 24.99, "status": "Shipped"}
+    {"op": "delete", "order_ids": "1001-1050, 1060"}
+    {"op": "set_status", "order_ids": [1003, 1004], "status": "Delivered"}
+
+Responses look like {"ok": true, "result": ...} or {"ok": false, "error": "..."};
+an "id" given in the request is copied into its response.
+
+Usage:
+    python order_server.py --port 8765
+    python order_server.py --unix /tmp/orders.sock
+    python order_server.py --backend sqlite
+------------------------------------------------
+"""
+
+# --- Imports ---
+import argparse    # For the command line options
+import asyncio     # For serving many clients in one process
+import contextlib  # For hiding the messages printed by main.py
+import datetime    # For the default order date of new orders
+import io          # For capturing those messages in memory
+import json        # For the line-delimited JSON protocol
+import signal      # For stopping the server cleanly on SIGINT / SIGTERM
+import sys         # For exit codes
+
+import main        # The order store and its operations
+
+
+# --- Server Settings ---
+default_host = '127.0.0.1'  # Only local clients can connect by default
+default_port = 8765
+group_commit_delay = 0.005  # Seconds the writer waits for more writes before saving
+group_commit_max = 1000     # Most write requests applied and saved together
+lock_retry_delay = 0.05     # Seconds the writer waits before trying the storage lock again
+query_limit = 1000          # Most orders returned by one query (the full count is always returned)
+line_limit = 1024 * 1024    # Longest request line accepted, in bytes
+report_groups = ('status', 'item', 'customer', 'day')
+report_sorts = ('revenue', 'count', 'quantity', 'label')
+write_ops = ('add', 'delete', 'set_status')
+
+
+# Function to run a main.py function without printing its messages
+def quietly(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+# Function to turn one row (plain values) into a JSON object
+def order_object(row):
+    return {"order_id": row[0], "customer_name": row[1], "item_purchased": row[2], "quantity": row[3],
+            "order_date": row[4], "total_price": row[5], "order_status": row[6]}
+
+# Function to read the Order IDs of a request: a list of IDs or a text such as "1001-1050, 1060"
+def request_order_ids(request):
+    order_ids = request.get("order_ids")
+    if isinstance(order_ids, str):
+        return main.parse_order_ids(order_ids)
+    if isinstance(order_ids, list) and all(isinstance(value, int) for value in order_ids):
+        return order_ids
+    raise ValueError("order_ids must be a list of Order IDs or a text such as '1001-1050, 1060'")
+
+# Function to read and check the status of a request
+def request_status(request):
+    status = str(request.get("status") or "").strip().capitalize()
+    if status not in main.valid_statuses:
+        raise ValueError(f"status '{request.get('status')}' is not Shipped, Delivered or Cancelled")
+    return status
+
+# Function to answer a get request
+def get_order(request):
+    try:
+        find_order_id = int(request.get("order_id"))
+    except (TypeError, ValueError):
+        raise ValueError(f"order_id '{request.get('order_id')}' is not an Order ID") from None
+    index = main.find_row(find_order_id)
+    if index is None:
+        raise LookupError(f"Order ID {find_order_id} not found")
+    return order_object(main.get_row(index))
+
+# Function to answer a query request
+def query_orders(request):
+    sort = request.get("sort", "id")
+    if sort not in ('id', 'date', 'newest'):
+        raise ValueError("sort must be id, date or newest")
+    limit = int(request.get("limit", query_limit))
+    rows = main.query_records(request.get("customer"), request.get("item"), request.get("status"),
+                              request.get("date_from"), request.get("date_to"))
+    main.sort_rows(rows, sort)
+    return {"count": len(rows), "orders": [order_object(main.get_row(index)) for index in rows[:max(limit, 0)]]}
+
+# Function to answer a report request
+def report_orders(request):
+    group_by = request.get("group_by", "status")
+    sort_by = request.get("sort", "label" if group_by == 'day' else "revenue")
+    if group_by not in report_groups:
+        raise ValueError("group_by must be status, item, customer or day")
+    if sort_by not in report_sorts:
+        raise ValueError("sort must be revenue, count, quantity or label")
+    return [{"group": label, "orders": count, "quantity": qty, "revenue": round(revenue, 2)}
+            for label, count, qty, revenue in main.report_totals(group_by, sort_by)]
+
+# Function to answer a summary request from the summary cache
+def summary_orders(request):
+    return main.order_summary()
+
+# Read requests and the functions that answer them
+read_handlers = {'get': get_order, 'query': query_orders, 'report': report_orders, 'summary': summary_orders}
+
+# Function to check a write request before it is queued, so bad requests never reach the writer
+# Returns the checked values the writer needs.
+def prepare_write(request):
+    op = request["op"]
+    if op == 'add':
+        return main.validate_import_row(request, datetime.datetime.now().strftime(main.date_format))
+    if op == 'delete':
+        return request_order_ids(request)
+    return request_order_ids(request), request_status(request)
+
+# Function to get the rows in memory of the given Order IDs (plain values)
+def loaded_rows(order_ids):
+    return [main.get_row(index) for index in map(main.find_row, order_ids) if index is not None]
+
+# Function to apply a group of write requests to the order store
+# New Order IDs for all the adds of the group are reserved in one block.
+# Returns the result (or the error message) of each request, in order, and the
+# undo steps that take the applied writes back out of memory (see undo_writes).
+def apply_writes(writes):
+    add_count = sum(1 for op, values, future in writes if op == 'add')
+    next_order_id = quietly(main.new_last_row_id, add_count) if add_count else None
+
+    outcomes = []
+    undo = []
+    for op, values, future in writes:
+        try:
+            if op == 'add':
+                if next_order_id is None:
+                    raise RuntimeError("no Order ID could be reserved")
+                quietly(main.add_order, next_order_id, *values)
+                undo.append(('added', [next_order_id]))
+                outcomes.append((True, {"order_id": next_order_id}))
+                next_order_id += 1
+            elif op == 'delete':
+                rows = loaded_rows(values)
+                deleted, missing = quietly(main.batch_delete, values)
+                undo.append(('deleted', rows))
+                outcomes.append((True, {"deleted": deleted, "missing": missing}))
+            else:
+                rows = loaded_rows(values[0])
+                updated, missing = quietly(main.batch_update_status, *values)
+                undo.append(('updated', rows))
+                outcomes.append((True, {"updated": updated, "missing": missing}))
+        except Exception as e:
+            outcomes.append((False, str(e)))
+    return outcomes, undo
+
+# Function to take a group of writes that could not be saved back out of memory
+# 'change_count' is the number of pending changes before the group, so its changes
+# are dropped and never saved by a later group. Deleted rows come back in Order ID order.
+def undo_writes(undo, change_count):
+    del main.pending_changes[change_count:]
+    restored = False
+    for kind, values in reversed(undo):
+        if kind == 'added':
+            index = main.find_row(values[0])
+            if index is not None:
+                main.remove_row(index)
+        elif kind == 'deleted':
+            for row in values:
+                if main.find_row(row[0]) is None:
+                    main.append_row(*row)
+                    restored = True
+        else:
+            for row in values:
+                index = main.find_row(row[0])
+                if index is not None:
+                    main.set_row_status(index, row[6])
+    if restored:
+        main.sort_by_order_id()
+        if main.indexes_ready:
+            main.build_secondary_indexes()
+    main.records_not_saved = bool(main.pending_changes)
+
+    # Another session saved first (for example a conflict that rejected the save):
+    # pick up its changes, so the next group is checked against them
+    if main.read_version_stamp() != main.loaded_version:
+        quietly(main.refresh_records, False)
+
+# Function to save the pending changes of the order store
+# The changes are saved once they have left pending_changes (for example the journal
+# batch was written, even if stamping the new version failed afterwards).
+# Returns an error message, or None when the changes were saved.
+def save_changes():
+    if not main.records_not_saved:
+        return None
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        main.save_records()
+    if main.pending_changes:
+        # Only the reason; the advice after it is meant for the interactive menu
+        reason = (messages.getvalue().strip().splitlines() or ["unknown error"])[0]
+        return "the change could not be saved: " + reason
+    main.records_not_saved = False
+    return None
+
+# Function to take the exclusive storage lock without blocking the event loop
+# While another session holds the lock, the writer sleeps and tries again, so the
+# readers are still served. Release it with main.release_storage_lock().
+async def lock_storage():
+    while not main.acquire_storage_lock(True, wait=False):
+        await asyncio.sleep(lock_retry_delay)
+
+# Function to run the single writer task
+# It takes every write waiting in the queue (up to group_commit_max), applies them,
+# saves once for the whole group and then answers each request. A group that cannot
+# be saved is taken back out of memory, so a failed write is never saved later.
+# The storage lock is held from applying the group to saving it (or taking it back).
+async def run_writer(write_queue):
+    while True:
+        writes = [await write_queue.get()]
+        await asyncio.sleep(group_commit_delay)  # Let more writes join the group
+        while not write_queue.empty() and len(writes) < group_commit_max:
+            writes.append(write_queue.get_nowait())
+
+        await lock_storage()
+        try:
+            change_count = len(main.pending_changes)
+            outcomes, undo = apply_writes(writes)
+            save_error = save_changes()
+            if save_error:
+                undo_writes(undo, change_count)
+        finally:
+            main.release_storage_lock()
+        for (op, values, future), (ok, result) in zip(writes, outcomes):
+            if ok and save_error:
+                ok, result = False, save_error
+            if not future.done():  # The client may have disconnected
+                future.set_result((ok, result))
+            write_queue.task_done()
+
+# Function to answer one request line
+async def handle_request(line, write_queue):
+    request_id = None
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("a request must be a JSON object")
+        request_id = request.get("id")
+        op = request.get("op")
+
+        if op in read_handlers:
+            # Readers run between writer groups, so they always see saved-or-pending whole writes
+            ok, result = True, read_handlers[op](request)
+        elif op in write_ops:
+            future = asyncio.get_running_loop().create_future()
+            await write_queue.put((op, prepare_write(request), future))
+            ok, result = await future
+        else:
+            ok, result = False, f"unknown op '{op}' (use get, query, report, summary, add, delete or set_status)"
+
+    except Exception as e:
+        ok, result = False, str(e)
+
+    response = {"ok": True, "result": result} if ok else {"ok": False, "error": result}
+    if request_id is not None:
+        response["id"] = request_id
+    return response
+
+# Function to serve one client connection until it closes
+async def handle_client(reader, writer, write_queue):
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # The line was longer than line_limit; the rest of the stream cannot be trusted
+                writer.write((json.dumps({"ok": False, "error": "request line too long"}) + "\n").encode())
+                break
+            if not line:
+                break
+            if not line.strip():
+                continue
+            response = await handle_request(line, write_queue)
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+# Function to load the orders and serve them until the server is stopped
+async def serve(host=default_host, port=default_port, unix_path=None):
+    main.load_records(confirm=False)
+    if not main.records_loaded:
+        # No orders yet: start with an empty store, saved through the journal or database
+        main.clear_array()
+        main.build_secondary_indexes()
+        main.records_loaded = True
+
+    write_queue = asyncio.Queue()
+    writer_task = asyncio.create_task(run_writer(write_queue))
+    client_handler = lambda reader, writer: handle_client(reader, writer, write_queue)
+
+    if unix_path:
+        server = await asyncio.start_unix_server(client_handler, unix_path, limit=line_limit)
+        address = unix_path
+    else:
+        server = await asyncio.start_server(client_handler, host, port, limit=line_limit)
+        address = f"{host}:{port}"
+    print(f"Serving {len(main.order_index)} orders on {address} (Ctrl+C to stop).")
+
+    # Stop on Ctrl+C or SIGTERM (where the event loop supports signal handlers)
+    stop_event = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal_number, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    try:
+        async with server:
+            await stop_event.wait()
+    finally:
+        # Let the writer finish the queued writes, then stop it and save anything left
+        server.close()
+        await write_queue.join()
+        writer_task.cancel()
+        await lock_storage()
+        try:
+            save_error = save_changes()
+        finally:
+            main.release_storage_lock()
+        print(save_error or "Server stopped; all changes saved.")
+
+# Function to run the server from the command line
+def run_server(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the OrderInfoSystem orders over a local socket.")
+    parser.add_argument('--host', default=default_host, help="TCP address to listen on")
+    parser.add_argument('--port', type=int, default=default_port, help="TCP port to listen on")
+    parser.add_argument('--unix', metavar='PATH', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--backend', choices=('csv', 'sqlite', 'partitions'), default=main.storage_backend,
+                        help="storage backend to load and save the orders with")
+    args = parser.parse_args(argv)
+
+    main.storage_backend = args.backend
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error starting the server: {e}")
+        return 1
+    return 0
+
+
+# To start the server when run as a script
+if __name__ == "__main__":
+    sys.exit(run_server())
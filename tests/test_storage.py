@@ -0,0 +1,143 @@
+"""
+--------------------------------------------------------
+Title       : OrderInfoSystem - Storage Tests
+File        : tests/test_storage.py
+
+Description :
+Checks that saved orders survive a reload, that a torn journal batch is
+never replayed and that two sessions saving the same orders do not
+overwrite each other. Every test runs in its own temporary directory.
+
+Usage:
+    python -m pytest tests
+    python -m unittest discover tests
+------------------------------------------------
+"""
+
+# --- Imports ---
+import contextlib  # For hiding the messages printed by main.py
+import importlib   # For starting each session with fresh module state
+import io          # For capturing those messages in memory
+import os          # For switching into the temporary directory
+import subprocess  # For running a second session in its own process
+import sys         # For finding main.py and the Python interpreter
+import tempfile    # For the temporary directory of each test
+import unittest    # For the test cases
+
+app_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Online_Order_Details')
+sys.path.insert(0, app_folder)
+import main        # The order store under test
+
+order_rows = """Order_ID,Customer_Name,Item_Purchased,Quantity,Order_Date,Total_Price ($),Order_Status
+1001,Alice Johnson,Bluetooth Headset,2,10/04/2025,49.98,Shipped
+1002,Ravi Kumar,USB-C Cable,1,11/04/2025,9.99,Delivered
+1003,Emma Wong,Wireless Mouse,1,12/04/2025,24.99,Cancelled
+1004,James Lee,Laptop Stand,1,13/04/2025,34.95,Delivered
+"""
+
+
+# Function to run a main.py function without printing its messages
+def quietly(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+# Function to start a new session: fresh module state with the orders loaded
+def new_session():
+    importlib.reload(main)
+    quietly(main.load_records, confirm=False)
+    return main
+
+# Function to get every order in memory as plain values, in Order ID order
+def loaded_orders():
+    return [main.get_row(index) for index in sorted(main.order_index.values())]
+
+# Function to run command line operations as a second session in its own process
+def run_other_session(*argv):
+    return subprocess.run([sys.executable, os.path.join(app_folder, 'main.py'), *argv],
+                          capture_output=True, text=True, check=True)
+
+
+class StorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.previous_folder = os.getcwd()
+        self.folder = tempfile.TemporaryDirectory()
+        os.chdir(self.folder.name)
+        with open(main.file_name, mode='w', newline='') as csv_file_obj:
+            csv_file_obj.write(order_rows)
+
+    def tearDown(self):
+        if main.database_connection is not None:
+            main.database_connection.close()
+        os.chdir(self.previous_folder)
+        self.folder.cleanup()
+
+    def test_save_and_reload_give_the_same_orders(self):
+        session = new_session()
+        quietly(session.add_order, 1005, "Nina Patel", "Portable Charger", 3, "14/04/2025", 59.85, "Shipped")
+        quietly(session.batch_update_status, [1002, 1005], "Cancelled")
+        quietly(session.batch_delete, [1001])
+        quietly(session.save_records)
+        self.assertFalse(session.records_not_saved)
+        saved = loaded_orders()
+        self.assertEqual([row[0] for row in saved], [1002, 1003, 1004, 1005])
+
+        # Replayed from the journal, and again once the journal is folded into the CSV file
+        new_session()
+        self.assertEqual(loaded_orders(), saved)
+        quietly(main.compact_storage)
+        self.assertEqual(os.path.getsize(main.journal_file_name), 0)
+        new_session()
+        self.assertEqual(loaded_orders(), saved)
+        self.assertEqual(main.verify_summary(), [])
+
+    def test_torn_journal_batch_is_ignored_and_cut_off(self):
+        session = new_session()
+        quietly(session.batch_update_status, [1001], "Delivered")
+        quietly(session.save_records)
+
+        # A save that stopped before its commit line, then one whose line count is wrong
+        with open(main.journal_file_name, mode='a') as journal_obj:
+            journal_obj.write("D,1003\nC,2\nU,1002,Cancelled\n")
+        session = new_session()
+        self.assertEqual(session.get_row(session.find_row(1001))[6], "Delivered")
+        self.assertIsNotNone(session.find_row(1003))
+        self.assertEqual(session.get_row(session.find_row(1002))[6], "Delivered")
+
+        # The next save must not commit the torn line along with its own batch
+        quietly(session.batch_delete, [1004])
+        quietly(session.save_records)
+        session = new_session()
+        self.assertEqual(session.get_row(session.find_row(1002))[6], "Delivered")
+        self.assertIsNone(session.find_row(1004))
+        self.assertIsNotNone(session.find_row(1003))
+
+    def test_conflicting_save_is_rejected(self):
+        session = new_session()
+        quietly(session.batch_update_status, [1001], "Cancelled")
+        run_other_session('load', '+', 'set-status', 'Delivered', '1001', '+', 'save')
+
+        quietly(session.save_records)
+        self.assertTrue(session.records_not_saved)
+        self.assertEqual(len(session.pending_changes), 1)
+
+        # The other session's change is the one stored
+        new_session()
+        self.assertEqual(main.get_row(main.find_row(1001))[6], "Delivered")
+
+    def test_changes_to_different_orders_are_merged(self):
+        session = new_session()
+        quietly(session.batch_update_status, [1001], "Cancelled")
+        run_other_session('load', '+', 'delete', '1002', '+', 'save')
+
+        quietly(session.save_records)
+        self.assertFalse(session.records_not_saved)
+        self.assertIsNone(session.find_row(1002))
+
+        new_session()
+        self.assertEqual(main.get_row(main.find_row(1001))[6], "Cancelled")
+        self.assertIsNone(main.find_row(1002))
+
+
+if __name__ == "__main__":
+    unittest.main()